@@ -8,10 +8,12 @@
 #   - Persistent volume data (optional, can be heavy)
 #
 # Schedule: Runs every hour via cron, overwrites previous snapshot
-# Storage: Single backup file to save space (~50-100MB compressed)
+# Storage: 3 rotating archives (~50-100MB compressed each), plus a
+#          deduplicated object store (store/) keeping STORE_KEEP snapshots
+#          where each unchanged Kubernetes object is stored only once
 #
 # Author: InsightLearn DevOps Team
-# Version: 1.0.0
+# Version: 1.1.0
 ################################################################################
 
 set -euo pipefail
@@ -23,6 +25,9 @@ BACKUP_PATH="${BACKUP_DIR}/${BACKUP_FILE}"
 TEMP_DIR="/tmp/k3s-backup-$(date +%Y%m%d-%H%M%S)"
 NAMESPACE="insightlearn"
 LOG_FILE="/var/log/k3s-backup.log"
+STORE_DIR="${BACKUP_DIR}/store"
+STORE_KEEP=168  # Object store snapshots to keep (one week of hourly backups)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 
 # Colors for output
 RED='\033[0;31m'
@@ -58,7 +63,7 @@ mkdir -p "$BACKUP_DIR"
 mkdir -p "$TEMP_DIR"
 
 # 1. Backup ETCD (K3s embedded etcd)
-log "Step 1/7: Creating ETCD snapshot..."
+log "Step 1/8: Creating ETCD snapshot..."
 if /usr/local/bin/k3s etcd-snapshot save \
     --name "snapshot-$(date +%Y%m%d-%H%M%S)" \
     --etcd-snapshot-dir "$TEMP_DIR/etcd" 2>&1 | tee -a "$LOG_FILE"; then
@@ -68,7 +73,7 @@ else
 fi
 
 # 2. Backup all Kubernetes resources by type
-log "Step 2/7: Backing up Kubernetes resources..."
+log "Step 2/8: Backing up Kubernetes resources..."
 
 RESOURCE_DIR="$TEMP_DIR/resources"
 mkdir -p "$RESOURCE_DIR"
@@ -113,7 +118,7 @@ backup_resource "roles" "--all-namespaces"
 backup_resource "rolebindings" "--all-namespaces"
 
 # 3. Backup custom resources (if any)
-log "Step 3/7: Backing up custom resources..."
+log "Step 3/8: Backing up custom resources..."
 if kubectl get crd -o name 2>/dev/null | grep -q "."; then
     kubectl get crd -o yaml > "$RESOURCE_DIR/customresourcedefinitions.yaml" 2>/dev/null || true
     log "  ✓ Custom resource definitions backed up"
@@ -121,8 +126,21 @@ else
     log "  ! No custom resource definitions found"
 fi
 
-# 4. Backup K3s configuration
-log "Step 4/7: Backing up K3s configuration..."
+# 4. Add resources to the deduplicated object store (browsable by the restore GUI)
+log "Step 4/8: Storing deduplicated snapshot..."
+if [[ -f "$SCRIPT_DIR/restore-gui-server.py" ]]; then
+    if python3 "$SCRIPT_DIR/restore-gui-server.py" --ingest "$TEMP_DIR" \
+        --store "$STORE_DIR" --keep "$STORE_KEEP" 2>&1 | tee -a "$LOG_FILE"; then
+        log "  ✓ Snapshot stored in $STORE_DIR"
+    else
+        warn "  ! Object store update failed, archive backup continues"
+    fi
+else
+    warn "  ! restore-gui-server.py not found next to this script, object store skipped"
+fi
+
+# 5. Backup K3s configuration
+log "Step 5/8: Backing up K3s configuration..."
 mkdir -p "$TEMP_DIR/k3s-config"
 
 if [[ -f /etc/rancher/k3s/k3s.yaml ]]; then
@@ -135,8 +153,8 @@ fi
 
 log "  ✓ K3s configuration backed up"
 
-# 5. Create backup metadata
-log "Step 5/7: Creating backup metadata..."
+# 6. Create backup metadata
+log "Step 6/8: Creating backup metadata..."
 cat > "$TEMP_DIR/backup-metadata.txt" <<EOF
 Backup Timestamp: $(date -u +"%Y-%m-%d %H:%M:%S UTC")
 Hostname: $(hostname)
@@ -162,8 +180,8 @@ EOF
 
 log "  ✓ Metadata created"
 
-# 6. Compress backup (keep last 3 backups with rotation)
-log "Step 6/7: Compressing backup..."
+# 7. Compress backup (keep last 3 backups with rotation)
+log "Step 7/8: Compressing backup..."
 
 # Determine which backup file to use (rotation between backup-1, backup-2, and backup-3)
 BACKUP_1="$BACKUP_DIR/k3s-cluster-backup-1.tar.gz"
@@ -217,8 +235,8 @@ else
     exit 1
 fi
 
-# 7. Cleanup temporary files
-log "Step 7/7: Cleaning up..."
+# 8. Cleanup temporary files
+log "Step 8/8: Cleaning up..."
 rm -rf "$TEMP_DIR"
 log "  ✓ Temporary files removed"
 
@@ -264,7 +282,6 @@ if [[ -f "$BACKUP_3" ]]; then
 fi
 
 # Export metrics for Prometheus/Grafana monitoring
-SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 if [[ -f "$SCRIPT_DIR/export-dr-metrics.sh" ]]; then
     log "Exporting disaster recovery metrics..."
     bash "$SCRIPT_DIR/export-dr-metrics.sh" 2>&1 | tee -a "$LOG_FILE" || warn "Failed to export metrics"
@@ -5,23 +5,645 @@ Disaster Recovery Metrics HTTP Server for Prometheus
 Exposes disaster recovery metrics via HTTP on port 9101
 Prometheus can scrape this endpoint directly
 
+Metrics are gathered in-process by collectors (the checks formerly done by
+export-dr-metrics.sh). Each collector runs on its own thread with its own
+interval and timeout; scrapes are answered from their last results in
+memory, so a slow check only makes its own metrics stale.
+
 Usage:
     python3 dr-metrics-server.py [--port PORT] [--host HOST]
+                                 [--interval NAME=SECONDS] [--timeout NAME=SECONDS]
 
 Author: InsightLearn DevOps Team
-Version: 1.0.0
+Version: 1.1.0
 """
 
+import gzip
+import http.client
+import json
+import math
 import os
+import re
 import subprocess
+import threading
 import time
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 # Configuration
 DEFAULT_PORT = 9101
 DEFAULT_HOST = "0.0.0.0"
-METRICS_SCRIPT = Path(__file__).parent / "export-dr-metrics.sh"
+STARTUP_WAIT = 5            # Seconds the first scrape waits for collectors to report
+STALE_INTERVALS = 3         # Missed intervals (plus timeout) before a collector counts as stale
+GZIP_MIN_SIZE = 1024        # Smaller responses are sent uncompressed
+SCRAPE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Checked by the collectors (same sources as export-dr-metrics.sh)
+BACKUP_DIR = Path("/var/backups/k3s-cluster")
+LATEST_BACKUP = BACKUP_DIR / "latest-backup.tar.gz"
+BACKUP_LOG = Path("/var/log/k3s-backup.log")
+BACKUP_LOG_STATE = Path(os.environ.get("XDG_STATE_HOME", Path.home() / ".local" / "state")) \
+    / "dr-metrics-server" / "backup-log.json"   # Read offset and counters
+BACKUP_LOG_READ_SIZE = 1024 * 1024
+RESTORE_STATE_FILE = Path("/var/lib/k3s-restore-state")
+BACKUP_CRON_FILE = Path("/etc/cron.d/k3s-cluster-backup")
+BACKUP_CRON_MINUTE = 5      # Backups run at :05 every hour ("5 * * * *")
+RESTORE_SERVICE = "k3s-auto-restore.service"
+CLOUDFLARE_SERVICE = "cloudflared-tunnel.service"
+CLOUDFLARE_PROCESS = "cloudflared tunnel"
+EXTERNAL_HEALTH_URL = "https://www.insightlearn.cloud/health"
+K3S_BIN = "/usr/local/bin/k3s"
+K3S_NAMESPACE = "insightlearn"
+
+# backup-cluster-state.sh log lines: "[2025-01-31 10:05:01] message" or
+# "[...] ERROR: message", with the timestamp wrapped in colour codes
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+LOG_LINE = re.compile(r"\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\](?: (ERROR|WARNING):)? ?(.*)")
+SAVED_RESOURCES = re.compile(r"✓ Saved (\d+) (\S+)$")
+BACKUP_FATAL_ERRORS = {"Compression failed"}    # Errors after which the script exits
+
+
+def gauge(name, help_text, value, labels=None):
+    """Metric family with a single gauge sample"""
+    return (name, "gauge", help_text, [(labels or {}, value)])
+
+
+class Histogram:
+    """Cumulative histogram rendered as a metric family"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def family(self, name, help_text):
+        with self._lock:
+            samples = [("_bucket", {"le": str(bound)}, count)
+                       for bound, count in zip(self.buckets, self.counts)]
+            samples.append(("_bucket", {"le": "+Inf"}, self.count))
+            samples.append(("_sum", {}, f"{self.sum:.6f}"))
+            samples.append(("_count", {}, self.count))
+        return (name, "histogram", help_text, samples)
+
+
+SCRAPE_DURATION = Histogram(SCRAPE_BUCKETS)
+
+
+def process_metrics():
+    """RSS and CPU time of this exporter"""
+    rss = 0
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    times = os.times()
+    return [
+        gauge("process_resident_memory_bytes", "Resident memory size in bytes", rss),
+        ("process_cpu_seconds_total", "counter", "Total user and system CPU time spent in seconds",
+         [({}, f"{times.user + times.system:.2f}")]),
+    ]
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in sorted(labels.items()))
+    return "{" + pairs + "}"
+
+
+class CollectorError(Exception):
+    """A failed collect() that still has families to serve instead of the last good ones"""
+
+    def __init__(self, message, families):
+        super().__init__(message)
+        self.families = families
+
+
+class Collector:
+    """Gathers one group of metrics on its own thread and schedule
+
+    Subclasses implement collect(), returning a list of metric families
+    (name, type, help, [(labels, value)]). timeout bounds the commands
+    and network calls a collector makes. When collect() raises, the
+    previous results keep being served and the error is recorded, unless
+    it raises CollectorError, whose families replace them.
+    """
+
+    name = None
+    interval = 30
+    timeout = 10
+
+    def __init__(self, interval=None, timeout=None):
+        if interval is not None:
+            self.interval = interval
+        if timeout is not None:
+            self.timeout = timeout
+        self.families = []
+        self.collected_at = 0.0     # Wall-clock time of the last successful run
+        self.duration = 0.0         # Seconds the last run took
+        self.error = None           # Error of the last run, None if it succeeded
+        self.runs = 0
+        self.errors = 0
+        self.runtime = 0.0          # Total seconds spent in collect()
+        self.started_at = time.time()
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started_at = time.time()
+        threading.Thread(target=self._run, name=f"collector-{self.name}", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            time.sleep(self.interval)
+
+    def refresh(self):
+        """Run collect() once and keep its results on success"""
+        started = time.monotonic()
+        try:
+            families = self.collect()
+            error = None
+        except CollectorError as e:
+            families = e.families
+            error = str(e)
+        except subprocess.TimeoutExpired:
+            families = None
+            error = f"timed out after {self.timeout}s"
+        except Exception as e:
+            families = None
+            error = f"{type(e).__name__}: {e}"
+        duration = time.monotonic() - started
+
+        with self._lock:
+            self.duration = duration
+            self.error = error
+            self.runs += 1
+            self.runtime += duration
+            if error is not None:
+                self.errors += 1
+            if families is not None:
+                self.families = families
+            if error is None:
+                self.collected_at = time.time()
+        if error is not None:
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Collector {self.name} failed: {error}")
+        self.ready.set()
+
+    def snapshot(self):
+        """(families, collected_at, duration, error) from the last run"""
+        with self._lock:
+            return self.families, self.collected_at, self.duration, self.error
+
+    def totals(self):
+        """(runs, errors, runtime seconds) since start"""
+        with self._lock:
+            return self.runs, self.errors, self.runtime
+
+    def staleness(self, now=None):
+        """(seconds since last success or start, stale) for /health"""
+        now = time.time() if now is None else now
+        with self._lock:
+            age = now - (self.collected_at or self.started_at)
+        return age, age > STALE_INTERVALS * self.interval + self.timeout
+
+    def collect(self):
+        raise NotImplementedError
+
+    def run_command(self, *command):
+        """Run a command bounded by the collector timeout"""
+        return subprocess.run(command, capture_output=True, text=True, timeout=self.timeout)
+
+
+class BackupFileCollector(Collector):
+    """Latest backup timestamp, size and age; number of backups; next scheduled run"""
+
+    name = "backup_files"
+    interval = 30
+
+    def collect(self):
+        try:
+            # Path.stat() follows latest-backup.tar.gz to the real file, like stat -L
+            stat = LATEST_BACKUP.stat()
+            timestamp, size = int(stat.st_mtime), stat.st_size
+        except OSError:
+            timestamp, size = 0, 0
+
+        count = 0
+        if BACKUP_DIR.is_dir():
+            # Like find -type f: the latest-backup symlink is not counted
+            count = sum(1 for path in BACKUP_DIR.rglob("*.tar.gz")
+                        if path.is_file() and not path.is_symlink())
+
+        now = datetime.now()
+        next_backup = now.replace(minute=BACKUP_CRON_MINUTE, second=0, microsecond=0)
+        if now.minute >= BACKUP_CRON_MINUTE:
+            next_backup += timedelta(hours=1)
+
+        return [
+            gauge("insightlearn_dr_backup_last_success_timestamp_seconds",
+                  "Unix timestamp of last successful backup", timestamp),
+            gauge("insightlearn_dr_backup_size_bytes", "Size of latest backup in bytes", size),
+            gauge("insightlearn_dr_backup_age_seconds", "Age of latest backup in seconds",
+                  int(now.timestamp()) - timestamp),
+            gauge("insightlearn_dr_backup_count", "Number of backup files", count),
+            gauge("insightlearn_dr_next_backup_seconds", "Seconds until next scheduled backup",
+                  int((next_backup - now).total_seconds())),
+            gauge("insightlearn_dr_cron_job_configured", "Backup cron job configured (1=yes, 0=no)",
+                  int(BACKUP_CRON_FILE.is_file())),
+        ]
+
+
+class BackupLogCollector(Collector):
+    """Follows the backup log and counts backup runs
+
+    Each run reads only what backup-cluster-state.sh appended since the
+    previous one. The read offset and counters are saved to state_file,
+    so a restart resumes where it left off. A new inode means the log was
+    rotated (the rest of the old file is read from <log>.1 when present);
+    a file shorter than the offset means it was truncated.
+    """
+
+    name = "backup_log"
+    interval = 30
+
+    def __init__(self, path=BACKUP_LOG, state_file=BACKUP_LOG_STATE, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.state_file = Path(state_file)
+        self.state = None
+
+    def collect(self):
+        if self.state is None:
+            self.state = self._load_state()
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return self._families()
+
+        state = self.state
+        if state["inode"] != stat.st_ino:
+            if state["inode"] is not None:
+                rotated = self.path.with_name(self.path.name + ".1")
+                try:
+                    if rotated.stat().st_ino == state["inode"]:
+                        self._follow(rotated)
+                except FileNotFoundError:
+                    pass
+            state["inode"] = stat.st_ino
+            state["offset"] = 0
+        elif stat.st_size < state["offset"]:
+            state["offset"] = 0
+
+        if stat.st_size > state["offset"]:
+            self._follow(self.path)
+            self._save_state()
+        return self._families()
+
+    def _follow(self, path):
+        """Parse complete lines appended after the saved offset"""
+        with open(path, "rb") as f:
+            f.seek(self.state["offset"])
+            while True:
+                chunk = f.read(BACKUP_LOG_READ_SIZE)
+                if not chunk:
+                    break
+                end = chunk.rfind(b"\n")
+                if end < 0:
+                    if len(chunk) < BACKUP_LOG_READ_SIZE:
+                        break   # Line still being written
+                    end = len(chunk) - 1    # Overlong line; skip past it
+                for line in chunk[:end + 1].splitlines():
+                    self._parse_line(line.decode("utf-8", errors="replace"))
+                self.state["offset"] += end + 1
+                f.seek(self.state["offset"])
+
+    def _parse_line(self, line):
+        line = ANSI_ESCAPE.sub("", line)
+        match = LOG_LINE.match(line)
+        if match is None:
+            return
+        try:
+            timestamp = time.mktime(time.strptime(match.group(1), "%Y-%m-%d %H:%M:%S"))
+        except ValueError:
+            return
+        level, message = match.group(2), match.group(3).strip()
+        state = self.state
+
+        if level == "ERROR":
+            state["errors"] += 1
+            if message in BACKUP_FATAL_ERRORS and state["run_started"] is not None:
+                self._finish_run(timestamp, success=False)
+        elif level == "WARNING":
+            state["warnings"] += 1
+        elif message == "K3s Cluster Backup Started":
+            if state["run_started"] is not None:
+                # The previous run never logged its end
+                self._finish_run(timestamp, success=False)
+            state["started"] += 1
+            state["run_started"] = timestamp
+            state["run_resources"] = {}
+        elif message.startswith("Backup completed successfully"):
+            if state["run_started"] is not None:
+                self._finish_run(timestamp, success=True)
+            else:
+                state["completed"] += 1
+                state["last_status"] = 1
+        elif state["run_started"] is not None:
+            saved = SAVED_RESOURCES.match(message)
+            if saved:
+                state["run_resources"][saved.group(2)] = int(saved.group(1))
+
+    def _finish_run(self, timestamp, success):
+        state = self.state
+        state["completed" if success else "failed"] += 1
+        state["last_status"] = int(success)
+        state["last_duration"] = max(0.0, timestamp - state["run_started"])
+        if success:
+            state["resources"] = state["run_resources"]
+        state["run_started"] = None
+        state["run_resources"] = {}
+
+    def _families(self):
+        state = self.state
+        return [
+            gauge("insightlearn_dr_backup_last_status",
+                  "Last backup status (1=success, 0=failure)", state["last_status"]),
+            ("insightlearn_dr_backup_runs_started_total", "counter",
+             "Backup runs started, from the backup log", [({}, state["started"])]),
+            ("insightlearn_dr_backup_runs_completed_total", "counter",
+             "Backup runs that completed successfully", [({}, state["completed"])]),
+            ("insightlearn_dr_backup_runs_failed_total", "counter",
+             "Backup runs that failed or ended without completing", [({}, state["failed"])]),
+            gauge("insightlearn_dr_backup_in_progress", "Backup run in progress (1=yes, 0=no)",
+                  int(state["run_started"] is not None)),
+            gauge("insightlearn_dr_backup_last_duration_seconds",
+                  "Duration of the last finished backup run", f"{state['last_duration']:g}"),
+            ("insightlearn_dr_backup_log_errors_total", "counter",
+             "ERROR lines written to the backup log", [({}, state["errors"])]),
+            ("insightlearn_dr_backup_log_warnings_total", "counter",
+             "WARNING lines written to the backup log", [({}, state["warnings"])]),
+            ("insightlearn_dr_backup_resources_exported", "gauge",
+             "Resources saved per type by the last successful backup",
+             [({"type": kind}, count) for kind, count in sorted(state["resources"].items())]),
+        ]
+
+    def _load_state(self):
+        state = {
+            "inode": None, "offset": 0,
+            "started": 0, "completed": 0, "failed": 0, "errors": 0, "warnings": 0,
+            "last_status": 1, "last_duration": 0.0,
+            "run_started": None, "run_resources": {}, "resources": {},
+        }
+        try:
+            state.update(json.loads(self.state_file.read_text()))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Ignoring backup log state {self.state_file}: {e}")
+        return state
+
+    def _save_state(self):
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            temp = self.state_file.with_name(self.state_file.name + ".tmp")
+            temp.write_text(json.dumps(self.state))
+            os.replace(temp, self.state_file)
+        except OSError as e:
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Could not save backup log state: {e}")
+
+
+class DiskCollector(Collector):
+    """Disk space of the filesystem holding the backups"""
+
+    name = "disk"
+    interval = 60
+
+    def collect(self):
+        total = used = available = percent = 0
+        if BACKUP_DIR.is_dir():
+            stat = os.statvfs(BACKUP_DIR)
+            total = stat.f_blocks * stat.f_frsize
+            used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+            available = stat.f_bavail * stat.f_frsize
+            # df rounds the percentage of space usable by non-root users up
+            if used + available:
+                percent = math.ceil(used * 100 / (used + available))
+        return [
+            gauge("insightlearn_dr_disk_total_bytes", "Total disk space for backup location", total),
+            gauge("insightlearn_dr_disk_used_bytes", "Used disk space for backup location", used),
+            gauge("insightlearn_dr_disk_available_bytes", "Available disk space for backup location",
+                  available),
+            gauge("insightlearn_dr_disk_usage_percent", "Disk usage percentage for backup location",
+                  percent),
+        ]
+
+
+class RestoreStateCollector(Collector):
+    """Date of the last restore recorded by the auto-restore service"""
+
+    name = "restore_state"
+    interval = 60
+
+    def collect(self):
+        timestamp = 0
+        try:
+            restore_date = RESTORE_STATE_FILE.read_text().strip()[:8]
+            # YYYYMMDD, taken as local midnight like date -d
+            timestamp = int(time.mktime(time.strptime(restore_date, "%Y%m%d")))
+        except (OSError, ValueError):
+            pass
+        return [gauge("insightlearn_dr_last_restore_timestamp_seconds",
+                      "Unix timestamp of last restore", timestamp)]
+
+
+class ServiceCollector(Collector):
+    """systemd enabled/active state of one unit"""
+
+    interval = 60
+    timeout = 5
+
+    def __init__(self, name, unit, description, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.unit = unit
+        self.description = description
+
+    def collect(self):
+        families = []
+        for state in ("enabled", "active"):
+            try:
+                value = int(self.run_command("systemctl", f"is-{state}", self.unit).returncode == 0)
+            except FileNotFoundError:
+                value = 0   # No systemd on this host
+            families.append(gauge(f"insightlearn_dr_{self.name}_{state}",
+                                  f"{self.description} {state} (1=yes, 0=no)", value))
+        return families
+
+
+class CloudflareProcessCollector(Collector):
+    """Whether a cloudflared tunnel process is running, read from /proc"""
+
+    name = "cloudflare_process"
+    interval = 30
+
+    def collect(self):
+        running = 0
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/cmdline", "rb") as f:
+                    cmdline = f.read().replace(b"\0", b" ").decode(errors="replace")
+            except OSError:
+                continue    # Process exited or is not ours to inspect
+            if CLOUDFLARE_PROCESS in cmdline and entry.name != str(os.getpid()):
+                running = 1
+                break
+        return [gauge("insightlearn_dr_cloudflare_process_running",
+                      "Cloudflare process running (1=yes, 0=no)", running)]
+
+
+class ExternalAccessCollector(Collector):
+    """Whether the public site answers through the tunnel"""
+
+    name = "external_access"
+    interval = 60
+    timeout = 5
+
+    def collect(self):
+        try:
+            with urllib.request.urlopen(EXTERNAL_HEALTH_URL, timeout=self.timeout):
+                reachable = 1
+        except urllib.error.HTTPError:
+            reachable = 1   # Any HTTP answer means the tunnel is up
+        except (OSError, http.client.HTTPException):
+            reachable = 0
+        return [gauge("insightlearn_dr_external_access",
+                      "External access check (1=OK, 0=unreachable)", reachable)]
+
+
+class K3sPodsCollector(Collector):
+    """Running and total pods in the insightlearn namespace"""
+
+    name = "k3s_pods"
+    interval = 30
+    timeout = 15
+
+    def collect(self):
+        running = total = 0
+        if os.access(K3S_BIN, os.X_OK):
+            # An unreachable cluster reports 0 pods rather than the last good counts
+            try:
+                result = self.run_command(K3S_BIN, "kubectl", "get", "pods", "-n", K3S_NAMESPACE,
+                                          "--no-headers")
+            except subprocess.TimeoutExpired:
+                raise CollectorError(f"kubectl get pods timed out after {self.timeout}s",
+                                     self.families_for(0, 0)) from None
+            if result.returncode != 0:
+                raise CollectorError(f"kubectl get pods failed: {result.stderr.strip()}",
+                                     self.families_for(0, 0))
+            pods = [line for line in result.stdout.splitlines() if line.strip()]
+            total = len(pods)
+            running = sum(1 for line in pods if "Running" in line)
+        return self.families_for(running, total)
+
+    def families_for(self, running, total):
+        """Pod count families for the given counts"""
+        return [
+            gauge("insightlearn_dr_k3s_pods_running",
+                  f"Number of running pods in {K3S_NAMESPACE} namespace", running),
+            gauge("insightlearn_dr_k3s_pods_total",
+                  f"Total number of pods in {K3S_NAMESPACE} namespace", total),
+        ]
+
+
+COLLECTORS = [
+    BackupFileCollector(),
+    BackupLogCollector(),
+    DiskCollector(),
+    RestoreStateCollector(),
+    ServiceCollector("restore_service", RESTORE_SERVICE, "Auto-restore service"),
+    ServiceCollector("cloudflare_service", CLOUDFLARE_SERVICE, "Cloudflare tunnel service"),
+    CloudflareProcessCollector(),
+    ExternalAccessCollector(),
+    K3sPodsCollector(),
+]
+
+
+def render_metrics(collectors, openmetrics=False):
+    """Text exposition of the collectors' last results and exporter self-metrics
+
+    Prometheus text format 0.0.4 by default; OpenMetrics 1.0 names counter
+    families without _total, has no blank lines and ends with # EOF.
+    Samples are (labels, value), or (suffix, labels, value) for histograms.
+    """
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        metadata_name = name
+        if openmetrics and kind == "counter":
+            metadata_name = name.removesuffix("_total")
+        lines.append(f"# HELP {metadata_name} {help_text}")
+        lines.append(f"# TYPE {metadata_name} {kind}")
+        for sample in samples:
+            suffix, labels, value = sample if len(sample) == 3 else ("", *sample)
+            lines.append(f"{name}{suffix}{format_labels(labels)} {value}")
+        if not openmetrics:
+            lines.append("")
+
+    now = time.time()
+    ages, durations, successes = [], [], []
+    runs, errors, runtimes = [], [], []
+    for collector in collectors:
+        families, collected_at, duration, error = collector.snapshot()
+        for name, kind, help_text, samples in families:
+            family(name, kind, help_text, samples)
+        labels = {"collector": collector.name}
+        if collected_at:
+            ages.append((labels, f"{now - collected_at:.3f}"))
+        durations.append((labels, f"{duration:.3f}"))
+        successes.append((labels, int(error is None)))
+        run_count, error_count, runtime = collector.totals()
+        runs.append((labels, run_count))
+        errors.append((labels, error_count))
+        runtimes.append((labels, f"{runtime:.3f}"))
+
+    family("insightlearn_dr_exporter_collector_age_seconds", "gauge",
+           "Seconds since the collector last succeeded", ages)
+    family("insightlearn_dr_exporter_collector_duration_seconds", "gauge",
+           "Duration of the collector's last run", durations)
+    family("insightlearn_dr_exporter_collector_success", "gauge",
+           "Collector's last run succeeded (1=yes, 0=no)", successes)
+    family("insightlearn_dr_exporter_collector_runs_total", "counter",
+           "Collector runs since the exporter started", runs)
+    family("insightlearn_dr_exporter_collector_errors_total", "counter",
+           "Collector runs that failed or timed out", errors)
+    family("insightlearn_dr_exporter_collector_runtime_seconds_total", "counter",
+           "Total time spent running the collector", runtimes)
+    family(*SCRAPE_DURATION.family("insightlearn_dr_exporter_scrape_duration_seconds",
+                                   "Time to render and send /metrics"))
+    for name, kind, help_text, samples in process_metrics():
+        family(name, kind, help_text, samples)
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
 
 
 class MetricsHandler(BaseHTTPRequestHandler):
@@ -37,43 +659,58 @@ class MetricsHandler(BaseHTTPRequestHandler):
             self.send_error(404, "Not Found - Use /metrics or /health")
 
     def send_metrics(self):
-        """Generate and send Prometheus metrics"""
-        try:
-            # Execute metrics export script with OUTPUT_STDOUT=1
-            env = os.environ.copy()
-            env["OUTPUT_STDOUT"] = "1"
-            env["METRICS_FILE"] = "/tmp/dr_metrics_temp.prom"
-
-            result = subprocess.run(
-                ["bash", str(METRICS_SCRIPT)],
-                capture_output=True,
-                text=True,
-                timeout=30,
-                env=env
-            )
-
-            if result.returncode == 0:
-                metrics_data = result.stdout
-
-                # Send response
-                self.send_response(200)
-                self.send_header("Content-type", "text/plain; version=0.0.4")
-                self.end_headers()
-                self.wfile.write(metrics_data.encode())
-            else:
-                self.send_error(500, f"Metrics script failed: {result.stderr}")
+        """Send the collectors' last results in the format and encoding the scraper accepts"""
+        # Only scrapes right after startup wait, and never longer than STARTUP_WAIT
+        deadline = time.monotonic() + STARTUP_WAIT
+        for collector in COLLECTORS:
+            collector.ready.wait(max(0, deadline - time.monotonic()))
 
-        except subprocess.TimeoutExpired:
-            self.send_error(504, "Metrics script timeout")
+        started = time.monotonic()
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        try:
+            metrics_data = render_metrics(COLLECTORS, openmetrics=openmetrics).encode()
         except Exception as e:
             self.send_error(500, f"Error generating metrics: {str(e)}")
+            return
+
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "").lower() and \
+            len(metrics_data) >= GZIP_MIN_SIZE
+        if gzipped:
+            metrics_data = gzip.compress(metrics_data, compresslevel=6)
 
-    def send_health(self):
-        """Health check endpoint"""
         self.send_response(200)
+        self.send_header("Content-type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(metrics_data)))
+        self.send_header("Vary", "Accept, Accept-Encoding")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(metrics_data)
+        SCRAPE_DURATION.observe(time.monotonic() - started)
+
+    def send_health(self):
+        """Health check endpoint: OK, DEGRADED when some collectors are stale, 503 when all are"""
+        now = time.time()
+        lines = []
+        stale_count = 0
+        for collector in COLLECTORS:
+            age, stale = collector.staleness(now)
+            stale_count += stale
+            state = "STALE" if stale else "ok"
+            if collector.error is not None:
+                state += f" (last error: {collector.error})"
+            lines.append(f"{collector.name}: {state}, age {age:.0f}s, interval {collector.interval:g}s")
+
+        if stale_count == len(COLLECTORS):
+            status, summary = 503, "STALE"
+        elif stale_count:
+            status, summary = 200, "DEGRADED"
+        else:
+            status, summary = 200, "OK"
+        self.send_response(status)
         self.send_header("Content-type", "text/plain")
         self.end_headers()
-        self.wfile.write(b"OK\n")
+        self.wfile.write(("\n".join([summary] + lines) + "\n").encode())
 
     def log_message(self, format, *args):
         """Log HTTP requests with timestamp"""
@@ -82,14 +719,18 @@ class MetricsHandler(BaseHTTPRequestHandler):
 
 
 def run_server(host=DEFAULT_HOST, port=DEFAULT_PORT):
-    """Start HTTP server"""
+    """Start collectors and HTTP server"""
+    for collector in COLLECTORS:
+        collector.start()
     server_address = (host, port)
-    httpd = HTTPServer(server_address, MetricsHandler)
+    # A thread per request: a slow scrape never holds up /health probes
+    httpd = ThreadingHTTPServer(server_address, MetricsHandler)
+    httpd.daemon_threads = True
 
     print(f"Starting Disaster Recovery Metrics Server on {host}:{port}")
     print(f"Metrics endpoint: http://{host}:{port}/metrics")
     print(f"Health endpoint: http://{host}:{port}/health")
-    print(f"Metrics script: {METRICS_SCRIPT}")
+    print("Collectors: " + ", ".join(f"{c.name} ({c.interval:g}s)" for c in COLLECTORS))
     print("Press Ctrl+C to stop\n")
 
     try:
@@ -102,16 +743,34 @@ def run_server(host=DEFAULT_HOST, port=DEFAULT_PORT):
 if __name__ == "__main__":
     import argparse
 
+    def collector_override(value):
+        """NAME=SECONDS for --interval/--timeout"""
+        name, _, seconds = value.partition("=")
+        names = [collector.name for collector in COLLECTORS]
+        if name not in names:
+            raise argparse.ArgumentTypeError(f"unknown collector {name!r} (choose from {', '.join(names)})")
+        try:
+            return name, float(seconds)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid seconds in {value!r}")
+
     parser = argparse.ArgumentParser(description="DR Metrics HTTP Server for Prometheus")
     parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
     parser.add_argument("--host", type=str, default=DEFAULT_HOST, help=f"Host to bind to (default: {DEFAULT_HOST})")
+    parser.add_argument("--interval", type=collector_override, action="append", default=[],
+                        metavar="NAME=SECONDS", help="Override a collector's refresh interval, repeatable")
+    parser.add_argument("--state-file", type=Path, default=BACKUP_LOG_STATE,
+                        help=f"Where the backup log offset and counters are kept (default: {BACKUP_LOG_STATE})")
+    parser.add_argument("--timeout", type=collector_override, action="append", default=[],
+                        metavar="NAME=SECONDS", help="Override a collector's command/network timeout, repeatable")
 
     args = parser.parse_args()
 
-    # Check if metrics script exists
-    if not METRICS_SCRIPT.exists():
-        print(f"ERROR: Metrics script not found: {METRICS_SCRIPT}")
-        print("Please ensure export-dr-metrics.sh is in the same directory")
-        exit(1)
+    collectors = {collector.name: collector for collector in COLLECTORS}
+    collectors["backup_log"].state_file = args.state_file
+    for name, seconds in args.interval:
+        collectors[name].interval = seconds
+    for name, seconds in args.timeout:
+        collectors[name].timeout = seconds
 
     run_server(host=args.host, port=args.port)
@@ -7,37 +7,1034 @@ Web interface for restoring Kubernetes resources from backup.
 Provides user-friendly GUI instead of command line.
 
 Features:
-- List available backups
+- List available backups (archives and deduplicated object store snapshots)
 - Browse backup contents
 - Select resources to restore
 - One-click restore with confirmation
-- Real-time logs
+- Restores run as background jobs with real-time logs (Server-Sent Events)
 - Accessible from any browser in intranet
 
 Port: 9102
 URL: http://localhost:9102 or http://192.168.1.114:9102
 
 Author: InsightLearn DevOps Team
-Version: 1.0.0
+Version: 1.1.0
 """
 
 import os
 import sys
+import re
 import json
+import time
+import uuid
+import gzip
+import socket
+import hashlib
 import tarfile
 import subprocess
-import tempfile
-import shutil
 from datetime import datetime
 from pathlib import Path
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
+import argparse
 import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuration
 BACKUP_DIR = "/var/backups/k3s-cluster"
 PORT = 9102
 HOST = "0.0.0.0"
+INDEX_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) \
+    / "restore-gui" / "index"   # One JSON index per backup archive
+INDEX_VERSION = 2               # Bump when the index layout changes
+STORE_DIR = Path(BACKUP_DIR) / "store"  # Deduplicated object store written by backup-cluster-state.sh
+STORE_KEEP = 168                # Snapshots kept in the object store (one week of hourly backups)
+STORE_PREFIX = "snapshot-"      # GUI name prefix for object store snapshots
+RESTORE_WORKERS = 4             # Max concurrent kubectl batches within a restore tier
+RESTORE_TIMEOUT = 60            # Seconds allowed for each kubectl apply
+JOB_WORKERS = 2                 # Restore jobs running at once; further jobs queue
+INDEX_WORKERS = 2               # Archives indexed at once; further requests wait
+JOB_HISTORY = 20                # Finished restore jobs kept for /api/jobs
+SSE_KEEPALIVE = 15              # Seconds between keep-alive comments on idle event streams
+
+# Full restore runs tier by tier; a tier starts only if the previous one succeeded
+RESTORE_TIERS = [
+    ('namespace e CRD', ['namespaces', 'customresourcedefinitions']),
+    ('storage', ['persistentvolumes', 'persistentvolumeclaims']),
+    ('configurazione e RBAC', ['secrets', 'configmaps', 'serviceaccounts', 'roles', 'rolebindings',
+                               'clusterroles', 'clusterrolebindings']),
+    ('workload', ['statefulsets', 'daemonsets', 'deployments']),
+    ('rete', ['services', 'ingresses', 'networkpolicies']),
+]
+
+
+def _scalar(value):
+    """Plain or quoted YAML scalar as a string"""
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        value = value[1:-1]
+    return value
+
+# kubectl apply reports one line per object ("deployment.apps/api configured")
+# and names failed objects in its error details
+APPLY_RESULT = re.compile(r'^(?P<resource>[^/\s]+)/(?P<name>\S+) (?P<action>created|configured|unchanged)\b')
+APPLY_ERROR = re.compile(r'(?:GroupVersionKind: "[^"]*Kind=(?P<kind>[^"]*)"\s*)?'
+                         r'Name: "(?P<name>[^"]*)", Namespace: "(?P<namespace>[^"]*)"')
+
+# Kinds that live outside namespaces; kubectl gets no --namespace for them
+CLUSTER_SCOPED_KINDS = {
+    'Namespace', 'Node', 'PersistentVolume', 'StorageClass', 'CustomResourceDefinition',
+    'ClusterRole', 'ClusterRoleBinding', 'PriorityClass', 'IngressClass', 'RuntimeClass',
+    'CSIDriver', 'CSINode', 'APIService', 'ValidatingWebhookConfiguration',
+    'MutatingWebhookConfiguration', 'VolumeSnapshotClass',
+}
+
+# Server-managed metadata ignored when comparing backup objects with live ones
+VOLATILE_METADATA = {'resourceVersion', 'uid', 'creationTimestamp', 'generation', 'managedFields', 'selfLink'}
+
+
+ManifestObject = namedtuple('ManifestObject', 'kind namespace name manifest')
+
+
+def iter_manifest_objects(lines, keep_manifests=False):
+    """Yield a ManifestObject for every object in kubectl YAML output
+
+    Handles the block style kubectl emits: a List document whose objects are
+    entries of items:, or plain objects separated by '---'. Input is consumed
+    line by line and only each object's own kind and metadata.name/namespace
+    are read, so nested kind: fields (ownerReferences, volume sources, ...)
+    are not mistaken for objects. With keep_manifests, each object's own YAML
+    is returned as a standalone document in .manifest.
+    """
+    doc = {'lines': []}
+    item = None
+    in_items = False
+    dash_indent = None      # Indent of the '- ' that starts each list item
+    obj, obj_indent = doc, 0
+    in_metadata, metadata_indent = False, None
+
+    def finish(current):
+        if not current or not current.get('kind') or current['kind'].endswith('List'):
+            return None
+        manifest = '\n'.join(current['lines']) + '\n' if keep_manifests else None
+        return ManifestObject(current['kind'], current.get('namespace', ''), current.get('name', ''), manifest)
+
+    def keep(line):
+        if not keep_manifests:
+            return
+        if obj is doc:
+            doc['lines'].append(line)
+        else:
+            item['lines'].append(line[obj_indent:] if line[:obj_indent].isspace() else line.lstrip(' '))
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.rstrip('\r\n')
+        text = line.lstrip(' ')
+        indent = len(line) - len(text)
+
+        if indent == 0 and (text in ('---', '...') or text.startswith('--- ')):
+            for current in (item, doc):
+                found = finish(current)
+                if found:
+                    yield found
+            doc, item, in_items, dash_indent = {'lines': []}, None, False, None
+            obj, obj_indent, in_metadata = doc, 0, False
+            continue
+
+        if not text or text.startswith('#'):
+            keep(line)
+            continue
+
+        if in_items:
+            if (text.startswith('- ') or text == '-') and dash_indent in (None, indent):
+                dash_indent = indent
+                found = finish(item)
+                if found:
+                    yield found
+                item = {'lines': []}
+                obj, obj_indent, in_metadata = item, indent + 2, False
+                text = text[1:].lstrip(' ')
+                indent = obj_indent
+                if not text:
+                    continue
+                line = ' ' * indent + text
+            elif indent == 0 or (dash_indent is not None and indent <= dash_indent):
+                found = finish(item)
+                if found:
+                    yield found
+                item, in_items = None, False
+                obj, obj_indent, in_metadata = doc, 0, False
+
+        keep(line)
+        if indent == obj_indent:
+            key, _, value = text.partition(':')
+            in_metadata, metadata_indent = key == 'metadata', None
+            if key == 'kind':
+                obj['kind'] = _scalar(value)
+            elif key == 'items' and obj is doc and not value.strip():
+                in_items, dash_indent = True, None
+        elif in_metadata and indent > obj_indent:
+            if metadata_indent is None:
+                metadata_indent = indent
+            if indent == metadata_indent:
+                key, _, value = text.partition(':')
+                if key in ('name', 'namespace'):
+                    obj[key] = _scalar(value)
+
+    for current in (item, doc):
+        found = finish(current)
+        if found:
+            yield found
+
+
+class BackupIndex:
+    """Per-backup metadata cache so browsing doesn't extract archives
+
+    Each archive is scanned once and the result is kept in memory and as JSON
+    under INDEX_DIR. An index is rebuilt when its archive's size or mtime
+    changes. Concurrent requests for the same archive share one build, and at
+    most `workers` archives are scanned at a time.
+    """
+
+    def __init__(self, cache_dir=INDEX_DIR, workers=INDEX_WORKERS):
+        self.cache_dir = Path(cache_dir)
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.building = {}      # Backup name -> lock held while it is (re)built
+        self.slots = threading.BoundedSemaphore(workers)
+        self.workers = workers
+        self.running = 0
+        self.waiting = 0
+
+    def get(self, backup_path):
+        """Return the index for a backup, building it if missing or stale"""
+        backup_path = Path(backup_path)
+        stat = backup_path.stat()
+
+        with self.lock:
+            index = self.entries.get(backup_path.name)
+            if self._is_current(index, stat):
+                return index
+            building = self.building.setdefault(backup_path.name, threading.Lock())
+
+        with building:
+            with self.lock:
+                index = self.entries.get(backup_path.name)
+            if not self._is_current(index, stat):
+                index = self._load(backup_path.name)
+            if not self._is_current(index, stat):
+                index = self._build_in_slot(backup_path, stat)
+                self._save(index)
+            with self.lock:
+                self.entries[backup_path.name] = index
+            return index
+
+    def stats(self):
+        with self.lock:
+            return {'workers': self.workers, 'running': self.running, 'waiting': self.waiting}
+
+    def _build_in_slot(self, backup_path, stat):
+        with self.lock:
+            self.waiting += 1
+        with self.slots:
+            with self.lock:
+                self.waiting -= 1
+                self.running += 1
+            try:
+                return self._build(backup_path, stat)
+            finally:
+                with self.lock:
+                    self.running -= 1
+
+    def _is_current(self, index, stat):
+        return (index is not None
+                and index.get('version') == INDEX_VERSION
+                and index.get('size') == stat.st_size
+                and index.get('mtime') == stat.st_mtime)
+
+    def _build(self, backup_path, stat):
+        """Scan the archive once, recording every resources/<type>.yaml member"""
+        started = datetime.now()
+        resources = {}
+
+        with tarfile.open(backup_path, 'r|gz') as tar:
+            for member in tar:
+                path = Path(member.name)
+                if not member.isfile() or path.suffix != '.yaml' or path.parent.name != 'resources':
+                    continue
+
+                count, names, namespaces = 0, set(), set()
+                for obj in iter_manifest_objects(tar.extractfile(member)):
+                    count += 1
+                    names.add(obj.name)
+                    if obj.namespace:
+                        namespaces.add(obj.namespace)
+
+                resources[path.stem] = {
+                    'member': member.name,
+                    'offset': member.offset_data,
+                    'size': member.size,
+                    'count': count,
+                    'names': sorted(names),
+                    'namespaces': sorted(namespaces)
+                }
+
+        elapsed = (datetime.now() - started).total_seconds()
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Indexed {backup_path.name}: "
+              f"{len(resources)} resource types in {elapsed:.1f}s")
+
+        return {
+            'version': INDEX_VERSION,
+            'backup': backup_path.name,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'resources': resources
+        }
+
+    def read_resources(self, backup_path, resource_types):
+        """Read resources/<type>.yaml members straight from the archive
+
+        Members are read in archive order during a single decompression pass
+        using the offsets recorded in the index, so nothing is extracted to
+        disk and reading stops after the last requested member.
+        """
+        backup_path = Path(backup_path)
+        contents = {}
+
+        with open(backup_path, 'rb') as raw:
+            index = self.get(backup_path)
+            stat = os.fstat(raw.fileno())
+            if not self._is_current(index, stat):
+                raise RuntimeError(f'Backup {backup_path.name} changed while reading')
+
+            entries = sorted(
+                (index['resources'][t] | {'type': t} for t in resource_types if t in index['resources']),
+                key=lambda entry: entry['offset']
+            )
+            with gzip.GzipFile(fileobj=raw, mode='rb') as archive:
+                for entry in entries:
+                    archive.seek(entry['offset'])
+                    data = archive.read(entry['size'])
+                    if len(data) != entry['size']:
+                        raise RuntimeError(f"Truncated member {entry['member']} in {backup_path.name}")
+                    contents[entry['type']] = data
+
+        return contents
+
+    def _path(self, backup_name):
+        return self.cache_dir / f"{backup_name}.json"
+
+    def _load(self, backup_name):
+        try:
+            return json.loads(self._path(backup_name).read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Ignoring index for {backup_name}: {e}")
+            return None
+
+    def _save(self, index):
+        try:
+            path = self._path(index['backup'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp = path.with_name(path.name + '.tmp')
+            temp.write_text(json.dumps(index))
+            os.replace(temp, path)
+        except OSError as e:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Could not save index for {index['backup']}: {e}")
+
+
+BACKUP_INDEX = BackupIndex()
+
+
+class ObjectStore:
+    """Deduplicated backup store: objects by content hash, snapshots as manifests
+
+    Each object is kept once as plain YAML under objects/<hh>/<sha256>.yaml.
+    Status and server-managed metadata are dropped first, so an object that
+    did not change hashes the same from one backup to the next. A snapshot is
+    a small JSON manifest under snapshots/ listing each object's type, kind,
+    namespace, name and hash, so browsing and restoring need no decompression.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = Path(root)
+        self.lock = threading.Lock()
+        self.summaries = {}     # Snapshot id -> (manifest mtime, summary)
+
+    def _object_path(self, digest):
+        return self.root / 'objects' / digest[:2] / f"{digest}.yaml"
+
+    def _manifest_path(self, snapshot_id):
+        return self.root / 'snapshots' / f"{snapshot_id}.json"
+
+    def has(self, snapshot_id):
+        return bool(re.fullmatch(r'[\w-]+', snapshot_id)) and self._manifest_path(snapshot_id).exists()
+
+    def manifest(self, snapshot_id):
+        return json.loads(self._manifest_path(snapshot_id).read_text())
+
+    def read_object(self, digest):
+        return self._object_path(digest).read_bytes()
+
+    def snapshots(self):
+        """Summaries of all snapshots, newest first"""
+        summaries, listed = [], set()
+        for path in (self.root / 'snapshots').glob('*.json'):
+            snapshot_id = path.stem
+            # --ingest --keep may prune a manifest between the glob and reading it
+            try:
+                mtime = path.stat().st_mtime
+                with self.lock:
+                    cached = self.summaries.get(snapshot_id)
+                if not cached or cached[0] != mtime:
+                    manifest = json.loads(path.read_text())
+                    summary = {key: manifest[key] for key in ('id', 'created', 'size', 'objects')}
+                    cached = (mtime, summary)
+                    with self.lock:
+                        self.summaries[snapshot_id] = cached
+            except FileNotFoundError:
+                continue
+            listed.add(snapshot_id)
+            summaries.append(cached[1])
+
+        # Forget pruned snapshots so the cache stays as small as the store
+        with self.lock:
+            for snapshot_id in set(self.summaries) - listed:
+                del self.summaries[snapshot_id]
+        return sorted(summaries, key=lambda summary: summary['created'], reverse=True)
+
+    def ingest(self, backup_dir, keep=STORE_KEEP):
+        """Store <backup_dir>/resources/*.yaml as a new snapshot and prune old ones"""
+        snapshot_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+        resources = {}
+        size = new_objects = new_bytes = 0
+
+        for yaml_file in sorted((Path(backup_dir) / 'resources').glob('*.yaml')):
+            entries = []
+            with open(yaml_file, 'rb') as f:
+                for obj in iter_manifest_objects(f, keep_manifests=True):
+                    data = (normalize_manifest(obj.manifest) + '\n').encode()
+                    digest = hashlib.sha256(data).hexdigest()
+                    path = self._object_path(digest)
+                    if not path.exists():
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        temp = path.with_name(path.name + '.tmp')
+                        temp.write_bytes(data)
+                        os.replace(temp, path)
+                        new_objects += 1
+                        new_bytes += len(data)
+                    size += len(data)
+                    entries.append([obj.kind, obj.namespace, obj.name, digest])
+            resources[yaml_file.stem] = entries
+
+        manifest = {
+            'id': snapshot_id,
+            'created': time.time(),
+            'hostname': socket.gethostname(),
+            'size': size,
+            'objects': sum(len(entries) for entries in resources.values()),
+            'resources': resources
+        }
+        path = self._manifest_path(snapshot_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(path.name + '.tmp')
+        temp.write_text(json.dumps(manifest))
+        os.replace(temp, path)
+
+        removed_snapshots, removed_objects = self.prune(keep)
+        return {
+            'id': snapshot_id,
+            'objects': manifest['objects'],
+            'new_objects': new_objects,
+            'new_bytes': new_bytes,
+            'size': size,
+            'pruned_snapshots': removed_snapshots,
+            'pruned_objects': removed_objects
+        }
+
+    def prune(self, keep):
+        """Drop all but the newest `keep` snapshots and objects no snapshot uses"""
+        manifests = sorted((self.root / 'snapshots').glob('*.json'), key=lambda path: path.stem, reverse=True)
+        for path in manifests[keep:]:
+            path.unlink()
+
+        referenced = set()
+        for path in manifests[:keep]:
+            for entries in json.loads(path.read_text())['resources'].values():
+                referenced.update(entry[3] for entry in entries)
+
+        removed = 0
+        for path in (self.root / 'objects').glob('*/*.yaml'):
+            if path.stem not in referenced:
+                path.unlink()
+                removed += 1
+        return len(manifests[keep:]), removed
+
+
+OBJECT_STORE = ObjectStore()
+
+
+class ArchiveBackup:
+    """A .tar.gz backup, read through BACKUP_INDEX"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.name = self.path.name
+
+    def index(self):
+        return BACKUP_INDEX.get(self.path)
+
+    def read_resources(self, resource_types):
+        return BACKUP_INDEX.read_resources(self.path, resource_types)
+
+
+class StoreSnapshot:
+    """An object store snapshot, usable wherever an archive backup is"""
+
+    def __init__(self, store, snapshot_id):
+        self.store = store
+        self.snapshot_id = snapshot_id
+        self.name = STORE_PREFIX + snapshot_id
+
+    def index(self):
+        resources = {}
+        for resource_type, entries in self.store.manifest(self.snapshot_id)['resources'].items():
+            resources[resource_type] = {
+                'count': len(entries),
+                'names': sorted({entry[2] for entry in entries}),
+                'namespaces': sorted({entry[1] for entry in entries if entry[1]})
+            }
+        return {'resources': resources}
+
+    def read_resources(self, resource_types):
+        """Objects of each type as one multi-document YAML stream"""
+        manifest = self.store.manifest(self.snapshot_id)
+        return {
+            resource_type: b''.join(b'---\n' + self.store.read_object(entry[3])
+                                    for entry in manifest['resources'][resource_type])
+            for resource_type in resource_types if resource_type in manifest['resources']
+        }
+
+
+def find_backup(name):
+    """Archive or object store snapshot by its GUI name, or None"""
+    if name.startswith(STORE_PREFIX) and not name.endswith('.tar.gz'):
+        snapshot_id = name[len(STORE_PREFIX):]
+        return StoreSnapshot(OBJECT_STORE, snapshot_id) if OBJECT_STORE.has(snapshot_id) else None
+    path = Path(BACKUP_DIR) / name
+    return ArchiveBackup(path) if path.exists() else None
+
+
+def target_namespace(obj, default_namespace):
+    """Namespace kubectl should apply an object in; '' for cluster-scoped objects
+
+    Objects keep the namespace they were backed up from; only namespaced
+    objects that carry none fall back to the requested namespace.
+    """
+    if obj.namespace:
+        return obj.namespace
+    return '' if obj.kind in CLUSTER_SCOPED_KINDS else default_namespace
+
+
+def apply_objects(objects, default_namespace, timeout=RESTORE_TIMEOUT):
+    """kubectl apply ManifestObjects, one call per target namespace
+
+    Returns ([(object, outcome)], stderr), where outcome is created,
+    configured, unchanged or failed, in the order the objects were given.
+    """
+    groups = {}
+    for obj in objects:
+        groups.setdefault(target_namespace(obj, default_namespace), []).append(obj)
+
+    outcomes, errors = {}, []
+    for namespace, group in groups.items():
+        results, stderr = _apply_batch(group, namespace, timeout)
+        for obj, outcome in results:
+            outcomes[id(obj)] = outcome
+        if stderr.strip():
+            errors.append(stderr.strip())
+    return [(obj, outcomes[id(obj)]) for obj in objects], '\n'.join(errors)
+
+
+def _apply_batch(objects, namespace, timeout):
+    """One kubectl apply for objects sharing a target namespace ('' = none)
+
+    kubectl prints results in input order without namespaces, so same-named
+    objects are matched first come, first served.
+    """
+    cmd = ['kubectl', 'apply', '-f', '-']
+    if namespace:
+        cmd += ['--namespace', namespace]
+    manifest = '---\n'.join(obj.manifest for obj in objects)
+    try:
+        result = subprocess.run(cmd, input=manifest, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return [(obj, 'failed') for obj in objects], f'timeout dopo {timeout}s'
+
+    reported = {}
+    for line in result.stdout.splitlines():
+        match = APPLY_RESULT.match(line)
+        if match:
+            kind = match['resource'].split('.')[0]
+            reported.setdefault((kind, match['name']), []).append(match['action'])
+
+    # Errors name the object's kind when kubectl got that far; without it, any kind matches
+    failed = {(m['kind'], m['namespace'], m['name']) for m in APPLY_ERROR.finditer(result.stderr)}
+    results = []
+    for obj in objects:
+        actions = reported.get((obj.kind.lower(), obj.name))
+        where = (obj.namespace or namespace, obj.name)
+        if (obj.kind, *where) in failed or (None, *where) in failed or not actions:
+            results.append((obj, 'failed'))
+        else:
+            results.append((obj, actions.pop(0)))
+    return results, result.stderr
+
+
+def normalize_manifest(manifest):
+    """Object YAML without status and server-managed metadata, for comparison
+
+    Works on the standalone documents from iter_manifest_objects, whose keys
+    kubectl already emits in sorted order, so equal objects compare equal as
+    text.
+    """
+    kept = []
+    skip_indent = None
+    in_metadata, metadata_indent = False, None
+
+    for line in manifest.split('\n'):
+        text = line.lstrip(' ')
+        indent = len(line) - len(text)
+        if skip_indent is not None:
+            if not text or indent > skip_indent or (indent == skip_indent and text.startswith('- ')):
+                continue
+            skip_indent = None
+        if not text:
+            kept.append(line)
+            continue
+
+        key = text.partition(':')[0]
+        if indent == 0:
+            in_metadata, metadata_indent = key == 'metadata', None
+            if key == 'status':
+                skip_indent = 0
+                continue
+        elif in_metadata:
+            if metadata_indent is None:
+                metadata_indent = indent
+            if indent == metadata_indent and key in VOLATILE_METADATA:
+                skip_indent = indent
+                continue
+        kept.append(line)
+
+    return '\n'.join(kept).strip('\n')
+
+
+def fetch_live(resource_type, timeout=RESTORE_TIMEOUT):
+    """Live objects of one type in a single kubectl call
+
+    Returns ({(kind, namespace, name): normalized manifest}, error); the dict
+    is None if the cluster could not be queried.
+    """
+    cmd = ['kubectl', 'get', resource_type, '--all-namespaces', '-o', 'yaml']
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None, f'timeout dopo {timeout}s'
+    if result.returncode != 0:
+        return None, result.stderr.strip()
+
+    return {
+        (obj.kind, obj.namespace, obj.name): normalize_manifest(obj.manifest)
+        for obj in iter_manifest_objects(result.stdout.splitlines(), keep_manifests=True)
+    }, ''
+
+
+def classify_objects(objects, live):
+    """Outcome per backup object: unchanged, modified or missing"""
+    outcomes = []
+    for obj in objects:
+        current = live.get((obj.kind, obj.namespace, obj.name))
+        if current is None:
+            outcomes.append('missing')
+        elif current == normalize_manifest(obj.manifest):
+            outcomes.append('unchanged')
+        else:
+            outcomes.append('modified')
+    return outcomes
+
+
+class RestoreScheduler:
+    """Applies a backup tier by tier, in parallel within each tier
+
+    All objects of a tier are merged into batches, one per target namespace,
+    and applied with at most `workers` concurrent kubectl processes, so the
+    number of kubectl runs depends on tiers and namespaces, not on resource
+    types. Each batch is applied in its own namespace (none for cluster-scoped
+    objects), the requested one only for objects that carry none. A tier
+    only starts once every object of the previous tier applied cleanly.
+    With delta, each tier is first compared with live state and objects that
+    are already identical are skipped.
+    """
+
+    def __init__(self, workers=RESTORE_WORKERS, timeout=RESTORE_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+
+    def run(self, contents, namespace, log=None, delta=False):
+        """Restore {type: manifest bytes}; returns (output lines, stats)
+
+        Each output line is also passed to `log` as soon as it is known.
+        """
+        output_lines = []
+        stats = {'success': 0, 'unchanged': 0, 'errors': 0, 'completed': True, 'results': []}
+
+        def emit(line):
+            output_lines.append(line)
+            if log:
+                log(line)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for number, (label, resource_types) in enumerate(RESTORE_TIERS, 1):
+                objects = self._objects(contents, resource_types)
+                if not objects:
+                    continue
+
+                emit(f"🔹 Tier {number}: {label}")
+                if delta:
+                    objects = self._delta(objects, pool, emit, stats)
+                    if not objects:
+                        continue
+                batches = self._batches(objects, namespace)
+                outcomes, errors = {}, []
+                for results, stderr in pool.map(
+                        lambda batch: apply_objects([obj for _, obj in batch[1]], batch[0], self.timeout),
+                        batches):
+                    for obj, outcome in results:
+                        outcomes[id(obj)] = outcome
+                    if stderr.strip():
+                        errors.append(stderr.strip())
+
+                tier_errors = self._report(objects, outcomes, emit, stats)
+                for error in errors:
+                    emit(f"   {error[:200]}")
+
+                if tier_errors:
+                    emit(f"⛔ Tier {number} non riuscito: restore interrotto")
+                    stats['completed'] = False
+                    break
+
+        return output_lines, stats
+
+    def _objects(self, contents, resource_types):
+        """[(type, ManifestObject)] for the types of one tier"""
+        objects = []
+        for resource_type in resource_types:
+            if resource_type in contents:
+                for obj in iter_manifest_objects(contents[resource_type].splitlines(), keep_manifests=True):
+                    objects.append((resource_type, obj))
+        return objects
+
+    def _delta(self, objects, pool, emit, stats):
+        """Drop objects identical to live state; fetches each type once, in parallel"""
+        resource_types = list(dict.fromkeys(resource_type for resource_type, _ in objects))
+        live = dict(zip(resource_types, pool.map(lambda t: fetch_live(t, self.timeout), resource_types)))
+
+        remaining = []
+        for resource_type in resource_types:
+            typed = [obj for t, obj in objects if t == resource_type]
+            state, error = live[resource_type]
+            if state is None:
+                emit(f"⚠️ {resource_type}: stato live non disponibile, applico tutto ({error[:200]})")
+                remaining.extend((resource_type, obj) for obj in typed)
+                continue
+
+            outcomes = classify_objects(typed, state)
+            emit(f"🔍 {resource_type}: {outcomes.count('unchanged')} invariate, "
+                 f"{outcomes.count('modified')} modificate, {outcomes.count('missing')} mancanti")
+            for obj, outcome in zip(typed, outcomes):
+                if outcome == 'unchanged':
+                    stats['unchanged'] += 1
+                    stats['results'].append({
+                        'type': resource_type, 'kind': obj.kind, 'namespace': obj.namespace,
+                        'name': obj.name, 'result': 'unchanged'
+                    })
+                else:
+                    remaining.append((resource_type, obj))
+
+        return remaining
+
+    def _batches(self, objects, namespace):
+        """[(target namespace, entries)] for a tier, one batch per target namespace
+
+        kubectl rejects objects whose namespace differs from --namespace, so
+        a batch never mixes namespaces; the pool caps how many run at once.
+        """
+        batches = {}
+        for entry in objects:
+            batches.setdefault(target_namespace(entry[1], namespace), []).append(entry)
+        # Largest first so the pool is not left waiting on one big namespace
+        return sorted(batches.items(), key=lambda batch: len(batch[1]), reverse=True)
+
+    def _report(self, objects, outcomes, emit, stats):
+        """Summarise per-object outcomes by type; returns the tier's failures"""
+        tier_errors = 0
+        by_type = {}
+        for resource_type, obj in objects:
+            outcome = outcomes.get(id(obj), 'failed')
+            by_type.setdefault(resource_type, []).append((obj, outcome))
+            stats['results'].append({
+                'type': resource_type, 'kind': obj.kind, 'namespace': obj.namespace,
+                'name': obj.name, 'result': outcome
+            })
+
+        for resource_type, results in by_type.items():
+            counts = {'created': 0, 'configured': 0, 'unchanged': 0, 'failed': 0}
+            for _, outcome in results:
+                counts[outcome] += 1
+
+            emit(f"📦 Ripristino {resource_type}...")
+            emit(f"✅ {counts['created'] + counts['configured']} risorse applicate "
+                                f"({counts['created']} create, {counts['configured']} aggiornate, "
+                                f"{counts['unchanged']} invariate)")
+            for obj, outcome in results:
+                if outcome == 'failed':
+                    where = f"{obj.namespace}/" if obj.namespace else ""
+                    emit(f"❌ Errore: {where}{obj.name}")
+
+            stats['success'] += counts['created'] + counts['configured']
+            stats['unchanged'] += counts['unchanged']
+            stats['errors'] += counts['failed']
+            tier_errors += counts['failed']
+
+        return tier_errors
+
+
+RESTORE_SCHEDULER = RestoreScheduler()
+
+
+def select_objects(backup, resource_type, resource_name, namespace):
+    """Backed-up objects named resource_name, preferring the requested namespace"""
+    contents = backup.read_resources([resource_type])
+    if resource_type not in contents:
+        return []
+    objects = [obj for obj in iter_manifest_objects(contents[resource_type].splitlines(), keep_manifests=True)
+               if obj.name == resource_name]
+    if any(obj.namespace == namespace for obj in objects):
+        objects = [obj for obj in objects if obj.namespace == namespace]
+    return objects
+
+
+def restore_resource(job, objects, resource_type, resource_name, namespace):
+    """Restore objects picked by select_objects() (runs as a job)"""
+    job.log(f"📦 Ripristino {resource_type}/{resource_name}...")
+    results, stderr = apply_objects(objects, namespace, timeout=30)
+    for obj, outcome in results:
+        job.log(f"{'❌' if outcome == 'failed' else '✅'} {obj.kind.lower()}/{obj.name} {outcome}")
+    if stderr.strip():
+        job.log(stderr.strip())
+
+    output = '\n'.join(f"{obj.kind.lower()}/{obj.name} {outcome}" for obj, outcome in results)
+    results = [{'kind': obj.kind, 'namespace': obj.namespace, 'name': obj.name, 'result': outcome}
+               for obj, outcome in results]
+    success = all(result['result'] != 'failed' for result in results)
+    return {
+        'success': success,
+        'message': f'Resource {resource_name} restored successfully' if success else None,
+        'error': None if success else 'Restore failed',
+        'output': output,
+        'stderr': stderr,
+        'results': results
+    }
+
+
+def restore_full(job, backup, namespace, delta=False):
+    """Restore every resource type of a backup tier by tier (runs as a job)"""
+    resource_types = [t for _, types in RESTORE_TIERS for t in types]
+    job.log(f"📂 Lettura di {backup.name}...")
+    contents = backup.read_resources(resource_types)
+    if not contents:
+        return {'success': False, 'error': 'Resources not found in backup'}
+
+    output_lines, stats = RESTORE_SCHEDULER.run(contents, namespace, log=job.log, delta=delta)
+    message = (f"Restore completo: {stats['success']} risorse ripristinate, {stats['errors']} errori"
+               if stats['completed'] else
+               f"Restore interrotto: {stats['success']} risorse ripristinate, {stats['errors']} errori")
+    job.log(message)
+
+    return {
+        'success': stats['completed'],
+        'message': message,
+        'error': None if stats['completed'] else message,
+        'output': '\n'.join(output_lines),
+        'stats': stats
+    }
+
+
+def diff_backup(job, backup, resource_types=None):
+    """Compare backup objects with live cluster state without applying (runs as a job)"""
+    index = backup.index()
+    resource_types = [t for t in resource_types or sorted(index['resources']) if t in index['resources']]
+    contents = backup.read_resources(resource_types)
+
+    diff = {}
+    totals = {'unchanged': 0, 'modified': 0, 'missing': 0}
+    with ThreadPoolExecutor(max_workers=RESTORE_SCHEDULER.workers) as pool:
+        fetched = pool.map(lambda t: fetch_live(t, RESTORE_SCHEDULER.timeout), resource_types)
+        for resource_type, (live, error) in zip(resource_types, fetched):
+            if live is None:
+                diff[resource_type] = {'error': error}
+                job.log(f"⚠️ {resource_type}: stato live non disponibile ({error[:200]})")
+                continue
+
+            objects = list(iter_manifest_objects(contents[resource_type].splitlines(), keep_manifests=True))
+            outcomes = classify_objects(objects, live)
+            entry = {'unchanged': outcomes.count('unchanged'), 'modified': [], 'missing': []}
+            for obj, outcome in zip(objects, outcomes):
+                if outcome != 'unchanged':
+                    entry[outcome].append(f"{obj.namespace}/{obj.name}" if obj.namespace else obj.name)
+            backed_up = {(obj.kind, obj.namespace, obj.name) for obj in objects}
+            entry['live_only'] = sum(1 for key in live if key not in backed_up)
+            diff[resource_type] = entry
+
+            totals['unchanged'] += entry['unchanged']
+            totals['modified'] += len(entry['modified'])
+            totals['missing'] += len(entry['missing'])
+            job.log(f"🔍 {resource_type}: {entry['unchanged']} invariate, {len(entry['modified'])} modificate, "
+                    f"{len(entry['missing'])} mancanti, {entry['live_only']} solo nel cluster")
+            for outcome in ('modified', 'missing'):
+                for name in entry[outcome][:20]:
+                    job.log(f"   {'✏️' if outcome == 'modified' else '➕'} {name}")
+
+    message = (f"Anteprima: {totals['modified']} modificate, {totals['missing']} mancanti, "
+               f"{totals['unchanged']} invariate")
+    job.log(message)
+    return {'success': True, 'message': message, 'diff': diff, 'totals': totals}
+
+
+class RestoreJob:
+    """A restore running in the background, with a replayable progress log"""
+
+    def __init__(self, kind, params, locks):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.locks = locks          # Namespaces the job writes ('' cluster-scoped, '*' all), None if read-only
+        self.status = 'queued'
+        self.lines = []
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.changed = threading.Condition()
+
+    def log(self, line):
+        with self.changed:
+            self.lines.append(line)
+            self.changed.notify_all()
+
+    def finish(self, result):
+        with self.changed:
+            self.result = result
+            self.status = 'succeeded' if result.get('success') else 'failed'
+            self.finished = time.time()
+            self.changed.notify_all()
+
+    def wait(self, seen, timeout):
+        """Wait for log lines after the first `seen`; returns (new lines, finished)"""
+        with self.changed:
+            self.changed.wait_for(lambda: len(self.lines) > seen or self.finished, timeout)
+            return self.lines[seen:], self.finished is not None
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'lines': len(self.lines)
+        }
+
+
+class JobManager:
+    """Runs restore jobs on a bounded pool and keeps recent ones around
+
+    At most `workers` jobs run at once; the rest wait in submission order.
+    Only one active job may write a namespace, and a full restore (locks
+    {'*'}) excludes every other restore. Read-only jobs use locks None.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, history=JOB_HISTORY):
+        self.workers = workers
+        self.history = history
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.pool = None
+
+    def submit(self, kind, params, locks, target, *args):
+        """Queue target(job, *args); returns (job, None) or (None, conflicting job)"""
+        with self.lock:
+            for active in self.jobs.values():
+                if active.finished or locks is None or active.locks is None:
+                    continue
+                if '*' in locks or '*' in active.locks or locks & active.locks:
+                    return None, active
+
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='restore-job')
+            job = RestoreJob(kind, params, locks)
+            ahead = sum(1 for j in self.jobs.values() if not j.finished)
+            self.jobs[job.id] = job
+            finished = [j for j in self.jobs.values() if j.finished]
+            for old in sorted(finished, key=lambda j: j.finished)[:max(0, len(finished) - self.history)]:
+                del self.jobs[old.id]
+
+        if ahead >= self.workers:
+            job.log(f"⏳ In coda: {ahead - self.workers + 1} restore prima di questo")
+        self.pool.submit(self._run, job, target, args)
+        return job, None
+
+    def _run(self, job, target, args):
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            result = target(job, *args)
+        except subprocess.TimeoutExpired:
+            result = {'success': False, 'error': 'Restore operation timed out'}
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        if result.get('error'):
+            job.log(f"❌ {result['error']}")
+        job.finish(result)
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda j: j.created, reverse=True)
+
+    def stats(self):
+        with self.lock:
+            active = [j for j in self.jobs.values() if not j.finished]
+            return {
+                'workers': self.workers,
+                'running': sum(1 for j in active if j.status == 'running'),
+                'queued': sum(1 for j in active if j.status == 'queued'),
+                'locked': sorted({namespace for j in active if j.locks for namespace in j.locks})
+            }
+
+
+RESTORE_JOBS = JobManager()
+
 
 class RestoreHandler(BaseHTTPRequestHandler):
     """HTTP request handler for restore GUI"""
@@ -74,6 +1071,14 @@ class RestoreHandler(BaseHTTPRequestHandler):
         elif path.startswith('/api/backup/'):
             backup_name = path.split('/')[-1]
             self._handle_backup_contents(backup_name)
+        elif path == '/api/status':
+            self._send_json({'jobs': RESTORE_JOBS.stats(), 'indexing': BACKUP_INDEX.stats()})
+        elif path == '/api/jobs':
+            self._send_json({'jobs': [job.summary() for job in RESTORE_JOBS.list()]})
+        elif path.startswith('/api/jobs/') and path.endswith('/events'):
+            self._handle_job_events(path.split('/')[-2])
+        elif path.startswith('/api/jobs/'):
+            self._handle_job(path.split('/')[-1])
         else:
             self.send_error(404, "Not Found")
 
@@ -95,6 +1100,8 @@ class RestoreHandler(BaseHTTPRequestHandler):
             self._handle_restore(data)
         elif path == '/api/restore-full':
             self._handle_restore_full(data)
+        elif path == '/api/diff':
+            self._handle_diff(data)
         else:
             self.send_error(404, "Not Found")
 
@@ -115,12 +1122,27 @@ class RestoreHandler(BaseHTTPRequestHandler):
                 stat = backup_file.stat()
                 backups.append({
                     'name': backup_file.name,
+                    'source': 'archive',
                     'size': stat.st_size,
                     'size_human': self._human_size(stat.st_size),
                     'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
                     'timestamp': stat.st_mtime
                 })
 
+            # Object store snapshots; size is the snapshot's logical (undeduplicated) size
+            if (OBJECT_STORE.root / 'snapshots').exists():
+                for snapshot in OBJECT_STORE.snapshots():
+                    backups.append({
+                        'name': STORE_PREFIX + snapshot['id'],
+                        'source': 'store',
+                        'size': snapshot['size'],
+                        'size_human': self._human_size(snapshot['size']),
+                        'modified': datetime.fromtimestamp(snapshot['created']).strftime('%Y-%m-%d %H:%M:%S'),
+                        'timestamp': snapshot['created'],
+                        'objects': snapshot['objects']
+                    })
+                backups.sort(key=lambda backup: backup['timestamp'], reverse=True)
+
             self._send_json({'backups': backups})
         except Exception as e:
             self._send_json({'error': str(e)}, 500)
@@ -128,56 +1150,35 @@ class RestoreHandler(BaseHTTPRequestHandler):
     def _handle_backup_contents(self, backup_name):
         """Get contents of a specific backup"""
         try:
-            backup_path = Path(BACKUP_DIR) / backup_name
+            backup = find_backup(backup_name)
 
-            if not backup_path.exists():
+            if not backup:
                 self._send_json({'error': 'Backup not found'}, 404)
                 return
 
-            # Extract to temp directory
-            with tempfile.TemporaryDirectory() as temp_dir:
-                with tarfile.open(backup_path, 'r:gz') as tar:
-                    tar.extractall(temp_dir)
-
-                # Find resources directory
-                resources_dir = None
-                for root, dirs, files in os.walk(temp_dir):
-                    if 'resources' in dirs:
-                        resources_dir = Path(root) / 'resources'
-                        break
-
-                if not resources_dir:
-                    self._send_json({'error': 'Resources not found in backup'}, 500)
-                    return
-
-                # Parse YAML files
-                resources = {}
-                for yaml_file in resources_dir.glob('*.yaml'):
-                    resource_type = yaml_file.stem
-
-                    # Count resources
-                    with open(yaml_file, 'r') as f:
-                        content = f.read()
-                        count = content.count('kind:')
-
-                    # Get resource names
-                    names = self._get_resource_names(yaml_file)
-
-                    resources[resource_type] = {
-                        'count': count,
-                        'names': names
-                    }
+            index = backup.index()
+            if not index['resources']:
+                self._send_json({'error': 'Resources not found in backup'}, 500)
+                return
 
-                self._send_json({
-                    'backup': backup_name,
-                    'resources': resources
-                })
+            resources = {}
+            for resource_type, entry in index['resources'].items():
+                resources[resource_type] = {
+                    'count': entry['count'],
+                    'names': entry['names'],
+                    'namespaces': entry['namespaces']
+                }
+
+            self._send_json({
+                'backup': backup_name,
+                'resources': resources
+            })
 
         except Exception as e:
             self._send_json({'error': str(e)}, 500)
 
     def _handle_restore(self, data):
-        """Execute restore operation"""
+        """Start a single-resource restore job"""
         try:
             backup_name = data.get('backup')
             resource_type = data.get('resource_type')
@@ -188,64 +1189,35 @@ class RestoreHandler(BaseHTTPRequestHandler):
                 self._send_json({'error': 'Missing required parameters'}, 400)
                 return
 
-            backup_path = Path(BACKUP_DIR) / backup_name
+            backup = find_backup(backup_name)
 
-            if not backup_path.exists():
+            if not backup:
                 self._send_json({'error': 'Backup not found'}, 404)
                 return
 
-            # Execute restore
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Extract backup
-                with tarfile.open(backup_path, 'r:gz') as tar:
-                    tar.extractall(temp_dir)
-
-                # Find resources directory
-                resources_dir = None
-                for root, dirs, files in os.walk(temp_dir):
-                    if 'resources' in dirs:
-                        resources_dir = Path(root) / 'resources'
-                        break
-
-                if not resources_dir:
-                    self._send_json({'error': 'Resources not found in backup'}, 500)
-                    return
-
-                yaml_file = resources_dir / f"{resource_type}.yaml"
-                if not yaml_file.exists():
-                    self._send_json({'error': f'Resource type {resource_type} not found'}, 404)
-                    return
-
-                # Apply resource
-                cmd = [
-                    'kubectl', 'apply', '-f', str(yaml_file),
-                    '--namespace', namespace
-                ]
-
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-
-                if result.returncode == 0:
-                    self._send_json({
-                        'success': True,
-                        'message': f'Resource {resource_name} restored successfully',
-                        'output': result.stdout,
-                        'stderr': result.stderr
-                    })
-                else:
-                    self._send_json({
-                        'success': False,
-                        'error': 'Restore failed',
-                        'output': result.stdout,
-                        'stderr': result.stderr
-                    }, 500)
+            if resource_type not in backup.index()['resources']:
+                self._send_json({'error': f'Resource type {resource_type} not found'}, 404)
+                return
+
+            # Lock the namespaces the objects are actually applied in, not just the requested one
+            objects = select_objects(backup, resource_type, resource_name, namespace)
+            if not objects:
+                self._send_json({'error': f'Resource {resource_name} not found in {resource_type}'}, 404)
+                return
+            locks = frozenset(target_namespace(obj, namespace) for obj in objects)
+
+            job, conflict = RESTORE_JOBS.submit('restore', data, locks, restore_resource,
+                                                objects, resource_type, resource_name, namespace)
+            if conflict:
+                self._send_conflict(conflict)
+                return
+            self._send_json({'success': True, 'job': job.summary()}, 202)
 
-        except subprocess.TimeoutExpired:
-            self._send_json({'error': 'Restore operation timed out'}, 500)
         except Exception as e:
             self._send_json({'error': str(e)}, 500)
 
     def _handle_restore_full(self, data):
-        """Execute full cluster restore from backup"""
+        """Start a full cluster restore job"""
         try:
             backup_name = data.get('backup')
             namespace = data.get('namespace', 'insightlearn')
@@ -254,118 +1226,101 @@ class RestoreHandler(BaseHTTPRequestHandler):
                 self._send_json({'error': 'Missing backup name'}, 400)
                 return
 
-            backup_path = Path(BACKUP_DIR) / backup_name
+            backup = find_backup(backup_name)
 
-            if not backup_path.exists():
+            if not backup:
                 self._send_json({'error': f'Backup {backup_name} not found'}, 404)
                 return
 
-            # Extract backup to temp directory
-            temp_dir = Path(f'/tmp/k3s-restore-full-{os.getpid()}')
-            temp_dir.mkdir(parents=True, exist_ok=True)
+            job, conflict = RESTORE_JOBS.submit('restore-full', data, frozenset('*'), restore_full, backup, namespace,
+                                                bool(data.get('only_changes')))
+            if conflict:
+                self._send_conflict(conflict)
+                return
+            self._send_json({'success': True, 'job': job.summary()}, 202)
 
-            try:
-                with tarfile.open(backup_path, 'r:gz') as tar:
-                    tar.extractall(temp_dir)
-
-                # Find resources directory
-                resources_dir = None
-                for root, dirs, files in os.walk(temp_dir):
-                    if 'resources' in dirs:
-                        resources_dir = Path(root) / 'resources'
-                        break
-
-                if not resources_dir:
-                    self._send_json({'error': 'Resources not found in backup'}, 500)
-                    return
-
-                # Apply resources in correct order (important for dependencies!)
-                resource_order = [
-                    'namespaces',
-                    'customresourcedefinitions',
-                    'persistentvolumes',
-                    'persistentvolumeclaims',
-                    'secrets',
-                    'configmaps',
-                    'serviceaccounts',
-                    'roles',
-                    'rolebindings',
-                    'clusterroles',
-                    'clusterrolebindings',
-                    'statefulsets',
-                    'daemonsets',
-                    'deployments',
-                    'services',
-                    'ingresses',
-                    'networkpolicies'
-                ]
-
-                output_lines = []
-                success_count = 0
-                error_count = 0
-
-                for resource_type in resource_order:
-                    yaml_file = resources_dir / f"{resource_type}.yaml"
-                    if not yaml_file.exists():
-                        continue
+        except Exception as e:
+            self._send_json({'error': str(e)}, 500)
 
-                    output_lines.append(f"\\n📦 Ripristino {resource_type}...")
-
-                    # Apply resource
-                    cmd = ['kubectl', 'apply', '-f', str(yaml_file), '--namespace', namespace]
-
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-
-                    if result.returncode == 0:
-                        # Count number of resources applied
-                        count = result.stdout.count('configured') + result.stdout.count('created')
-                        output_lines.append(f"✅ {count} risorse applicate")
-                        success_count += count
-                    else:
-                        output_lines.append(f"❌ Errore: {result.stderr[:200]}")
-                        error_count += 1
-
-                # Cleanup temp directory
-                import shutil
-                shutil.rmtree(temp_dir, ignore_errors=True)
-
-                self._send_json({
-                    'success': True,
-                    'message': f'Restore completo: {success_count} risorse ripristinate, {error_count} errori',
-                    'output': '\\n'.join(output_lines),
-                    'stats': {
-                        'success': success_count,
-                        'errors': error_count
-                    }
-                })
+    def _handle_diff(self, data):
+        """Start a dry-run comparison of a backup with the live cluster"""
+        try:
+            backup_name = data.get('backup')
+            resource_type = data.get('resource_type')
 
-            except Exception as e:
-                # Cleanup on error
-                import shutil
-                shutil.rmtree(temp_dir, ignore_errors=True)
-                raise e
+            if not backup_name:
+                self._send_json({'error': 'Missing backup name'}, 400)
+                return
+
+            backup = find_backup(backup_name)
+
+            if not backup:
+                self._send_json({'error': f'Backup {backup_name} not found'}, 404)
+                return
+
+            job, _ = RESTORE_JOBS.submit('diff', data, None, diff_backup, backup,
+                                         [resource_type] if resource_type else None)
+            self._send_json({'success': True, 'job': job.summary()}, 202)
 
-        except subprocess.TimeoutExpired:
-            self._send_json({'error': 'Restore operation timed out'}, 500)
         except Exception as e:
             self._send_json({'error': str(e)}, 500)
 
-    def _get_resource_names(self, yaml_file):
-        """Extract resource names from YAML file"""
+    def _send_conflict(self, job):
+        """Refuse a restore that overlaps an active job"""
+        if '*' in job.locks:
+            where = 'tutti i namespace'
+        else:
+            where = ', '.join(f'namespace {namespace}' if namespace else 'risorse di cluster'
+                              for namespace in sorted(job.locks))
+        self._send_json({
+            'error': f'Restore già in corso su {where} (job {job.id}, {job.status})',
+            'conflict': job.summary()
+        }, 409)
+
+    def _handle_job(self, job_id):
+        """Status, log and result of a restore job"""
+        job = RESTORE_JOBS.get(job_id)
+        if not job:
+            self._send_json({'error': 'Job not found'}, 404)
+            return
+
+        # Copy under the lock, send after: a slow client must not stall job.log()
+        with job.changed:
+            status = dict(job.summary(), log=list(job.lines), result=job.result)
+        self._send_json(status)
+
+    def _handle_job_events(self, job_id):
+        """Stream a job's log as Server-Sent Events, then its result"""
+        job = RESTORE_JOBS.get(job_id)
+        if not job:
+            self._send_json({'error': 'Job not found'}, 404)
+            return
+
         try:
-            result = subprocess.run(
-                ['kubectl', 'get', '-f', str(yaml_file), '--all-namespaces',
-                 '-o', 'custom-columns=NAME:.metadata.name', '--no-headers'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
+            seen = int(self.headers.get('Last-Event-ID') or 0)
+        except ValueError:
+            seen = 0
 
-            if result.returncode == 0:
-                return sorted(set(result.stdout.strip().split('\n')))
-            return []
-        except:
-            return []
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+
+        try:
+            while True:
+                lines, finished = job.wait(seen, SSE_KEEPALIVE)
+                for line in lines:
+                    seen += 1
+                    data = ''.join(f"data: {part}\n" for part in line.split('\n'))
+                    self.wfile.write(f"id: {seen}\nevent: log\n{data}\n".encode())
+                if finished and not lines:
+                    self.wfile.write(f"event: done\ndata: {json.dumps(job.result)}\n\n".encode())
+                    break
+                if not lines:
+                    self.wfile.write(b": keep-alive\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass   # Browser went away; the job keeps running
 
     def _human_size(self, bytes):
         """Convert bytes to human readable size"""
@@ -666,7 +1621,16 @@ class RestoreHandler(BaseHTTPRequestHandler):
             <div class="warning-box">
                 <strong>⚠️ Attenzione:</strong> Il ripristino sovrascriverà la risorsa esistente con la stessa nome nel namespace selezionato.
             </div>
+            <div class="form-group">
+                <label style="font-weight: normal;">
+                    <input type="checkbox" id="only-changes-input" checked>
+                    Restore completo: applica solo le risorse modificate o mancanti nel cluster
+                </label>
+            </div>
             <div style="display: flex; gap: 10px; flex-wrap: wrap;">
+                <button id="diff-btn" class="btn btn-secondary" disabled title="Confronta il backup con lo stato attuale del cluster senza modificarlo">
+                    🔍 Anteprima Differenze
+                </button>
                 <button id="restore-btn" class="btn btn-primary" disabled>
                     🔄 Ripristina Risorsa
                 </button>
@@ -703,6 +1667,7 @@ class RestoreHandler(BaseHTTPRequestHandler):
             document.getElementById('resource-type-select').addEventListener('change', onResourceTypeChange);
             document.getElementById('restore-btn').addEventListener('click', onRestore);
             document.getElementById('restore-full-btn').addEventListener('click', onRestoreFull);
+            document.getElementById('diff-btn').addEventListener('click', onDiff);
             document.getElementById('refresh-btn').addEventListener('click', () => {
                 loadBackups();
                 resetForm();
@@ -770,8 +1735,9 @@ class RestoreHandler(BaseHTTPRequestHandler):
                 infoBox.innerHTML = `<strong>Backup selezionato:</strong> ${backupName}<br>
                                      <strong>Risorse disponibili:</strong> ${Object.keys(backupContents).length} tipi`;
 
-                // Enable full restore button
+                // Enable full restore and diff buttons
                 document.getElementById('restore-full-btn').disabled = false;
+                document.getElementById('diff-btn').disabled = false;
 
                 // Populate resource types
                 const typeSelect = document.getElementById('resource-type-select');
@@ -863,20 +1829,21 @@ class RestoreHandler(BaseHTTPRequestHandler):
 
                 const data = await response.json();
 
-                hideLoading();
-
-                if (data.success) {
-                    showSuccess(`✅ Risorsa ${resourceName} ripristinata con successo!`);
-                    if (data.output) {
-                        showLog(data.output + (data.stderr ? '\\n' + data.stderr : ''));
-                    }
-                } else {
+                if (!data.job) {
+                    hideLoading();
                     showError(`❌ Errore durante il ripristino: ${data.error || 'Unknown error'}`);
-                    if (data.stderr) {
-                        showLog(data.stderr);
-                    }
+                    return;
                 }
 
+                followJob(data.job, result => {
+                    hideLoading();
+                    if (result.success) {
+                        showSuccess(`✅ Risorsa ${resourceName} ripristinata con successo!`);
+                    } else {
+                        showError(`❌ Errore durante il ripristino: ${result.error || 'Unknown error'}`);
+                    }
+                });
+
             } catch (error) {
                 hideLoading();
                 showError('Errore di connessione: ' + error.message);
@@ -921,29 +1888,98 @@ class RestoreHandler(BaseHTTPRequestHandler):
                     },
                     body: JSON.stringify({
                         backup: backupName,
-                        namespace: namespace
+                        namespace: namespace,
+                        only_changes: document.getElementById('only-changes-input').checked
                     })
                 });
 
                 const data = await response.json();
 
-                hideLoading();
+                if (!data.job) {
+                    hideLoading();
+                    showError(`❌ Errore durante il restore completo: ${data.error || 'Unknown error'}`);
+                    return;
+                }
 
-                if (data.success) {
-                    showSuccess(`✅ ${data.message}`);
-                    if (data.output) {
-                        showLog(data.output);
+                followJob(data.job, result => {
+                    hideLoading();
+                    if (result.success) {
+                        showSuccess(`✅ ${result.message}`);
+                    } else {
+                        showError(`❌ Errore durante il restore completo: ${result.error || 'Unknown error'}`);
                     }
-                } else {
-                    showError(`❌ Errore durante il restore completo: ${data.error || 'Unknown error'}`);
+                });
+
+            } catch (error) {
+                hideLoading();
+                showError('Errore di connessione: ' + error.message);
+            }
+        }
+
+        async function onDiff() {
+            const backupName = document.getElementById('backup-select').value;
+            const resourceType = document.getElementById('resource-type-select').value;
+
+            if (!backupName) {
+                showError('Seleziona un backup prima di procedere');
+                return;
+            }
+
+            showLoading();
+            hideMessages();
+
+            try {
+                const response = await fetch('/api/diff', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json'
+                    },
+                    body: JSON.stringify({
+                        backup: backupName,
+                        resource_type: resourceType || null
+                    })
+                });
+
+                const data = await response.json();
+
+                if (!data.job) {
+                    hideLoading();
+                    showError(`❌ Errore durante il confronto: ${data.error || 'Unknown error'}`);
+                    return;
                 }
 
+                followJob(data.job, result => {
+                    hideLoading();
+                    if (result.success) {
+                        showSuccess(`🔍 ${result.message}`);
+                    } else {
+                        showError(`❌ Errore durante il confronto: ${result.error || 'Unknown error'}`);
+                    }
+                });
+
             } catch (error) {
                 hideLoading();
                 showError('Errore di connessione: ' + error.message);
             }
         }
 
+        // Stream a restore job's log into the log box until it finishes
+        function followJob(job, onDone) {
+            const box = document.getElementById('log-box');
+            box.textContent = '';
+            box.style.display = 'block';
+
+            const source = new EventSource(`/api/jobs/${job.id}/events`);
+            source.addEventListener('log', event => {
+                box.textContent += event.data + '\\n';
+                box.scrollTop = box.scrollHeight;
+            });
+            source.addEventListener('done', event => {
+                source.close();
+                onDone(JSON.parse(event.data));
+            });
+        }
+
         function resetForm() {
             document.getElementById('resource-type-select').disabled = true;
             document.getElementById('resource-type-select').innerHTML = '<option value="">Prima seleziona un backup</option>';
@@ -951,6 +1987,7 @@ class RestoreHandler(BaseHTTPRequestHandler):
             document.getElementById('resource-name-select').innerHTML = '<option value="">Prima seleziona un tipo</option>';
             document.getElementById('restore-btn').disabled = true;
             document.getElementById('restore-full-btn').disabled = true;
+            document.getElementById('diff-btn').disabled = true;
             document.getElementById('backup-info').style.display = 'none';
             hideMessages();
         }
@@ -993,7 +2030,8 @@ class RestoreHandler(BaseHTTPRequestHandler):
 
 def run_server():
     """Run the HTTP server"""
-    server = HTTPServer((HOST, PORT), RestoreHandler)
+    server = ThreadingHTTPServer((HOST, PORT), RestoreHandler)
+    server.daemon_threads = True
     print(f"""
 ╔═══════════════════════════════════════════════════════════════════╗
 ║                                                                   ║
@@ -1017,6 +2055,32 @@ def run_server():
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Web GUI for restoring Kubernetes resources from backup")
+    parser.add_argument("--workers", type=int, default=RESTORE_WORKERS,
+                        help=f"Max concurrent kubectl batches within a restore tier (default: {RESTORE_WORKERS})")
+    parser.add_argument("--jobs", type=int, default=JOB_WORKERS,
+                        help=f"Restore jobs running at once, others queue (default: {JOB_WORKERS})")
+    parser.add_argument("--index-workers", type=int, default=INDEX_WORKERS,
+                        help=f"Backup archives indexed at once (default: {INDEX_WORKERS})")
+    parser.add_argument("--store", type=Path, default=STORE_DIR,
+                        help=f"Deduplicated object store directory (default: {STORE_DIR})")
+    parser.add_argument("--ingest", type=Path, metavar="BACKUP_DIR",
+                        help="Store BACKUP_DIR/resources/*.yaml as a new object store snapshot and exit")
+    parser.add_argument("--keep", type=int, default=STORE_KEEP,
+                        help=f"Snapshots kept in the object store when ingesting (default: {STORE_KEEP})")
+    args = parser.parse_args()
+    OBJECT_STORE = ObjectStore(args.store)
+
+    if args.ingest:
+        result = OBJECT_STORE.ingest(args.ingest, keep=max(1, args.keep))
+        print(f"  ✓ Stored snapshot {STORE_PREFIX}{result['id']}: {result['objects']} objects, "
+              f"{result['new_objects']} new ({result['new_bytes']} bytes)")
+        print(f"  ✓ Pruned {result['pruned_snapshots']} snapshots, {result['pruned_objects']} unreferenced objects")
+        sys.exit(0)
+    RESTORE_SCHEDULER.workers = max(1, args.workers)
+    RESTORE_JOBS.workers = max(1, args.jobs)
+    BACKUP_INDEX = BackupIndex(workers=max(1, args.index_workers))
+
     if os.geteuid() != 0:
         print("⚠️  Warning: This script should be run as root (sudo)")
         print("   Some restore operations may fail without root privileges")
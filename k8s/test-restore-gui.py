@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Restore check for restore-gui-server.py
+
+Builds a small backup with objects in several namespaces (including
+kube-system and cluster-scoped kinds), stores it both as a .tar.gz archive
+and as an object store snapshot, and restores each through RestoreScheduler
+against a stand-in kubectl. The stand-in rejects objects whose namespace
+differs from --namespace the way kubectl does, so every tier must apply
+each object in its own namespace for the restore to complete.
+
+Usage:
+    python3 test-restore-gui.py
+    python3 test-restore-gui.py --namespace insightlearn --verbose
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+
+GUI_SCRIPT = Path(__file__).resolve().parent / "restore-gui-server.py"
+
+# resources/<type>.yaml members of the synthetic backup, as kubectl get -o yaml emits them
+BACKUP_RESOURCES = {
+    'namespaces': [('Namespace', '', 'insightlearn')],
+    'clusterroles': [('ClusterRole', '', 'insightlearn-reader')],
+    'configmaps': [('ConfigMap', 'insightlearn', 'insightlearn-config'),
+                   ('ConfigMap', 'insightlearn', 'kube-root-ca.crt'),
+                   ('ConfigMap', 'kube-system', 'kube-root-ca.crt'),
+                   ('ConfigMap', 'kube-system', 'coredns')],
+    'deployments': [('Deployment', 'insightlearn', 'insightlearn-api'),
+                    ('Deployment', 'kube-system', 'coredns'),
+                    ('Deployment', '', 'unscoped-worker')],
+    'services': [('Service', 'insightlearn', 'insightlearn-api'),
+                 ('Service', 'kube-system', 'kube-dns')],
+}
+
+# Stand-in kubectl: records each apply and fails like kubectl on a namespace mismatch
+STAND_IN_KUBECTL = '''#!{python}
+import json, re, sys
+args = sys.argv[1:]
+if args[:1] != ['apply']:
+    sys.exit(1)
+namespace = args[args.index('--namespace') + 1] if '--namespace' in args else None
+objects = []
+for doc in re.split(r'^---$', sys.stdin.read(), flags=re.M):
+    kind = re.search(r'^kind: (\\S+)$', doc, re.M)
+    if kind:
+        name = re.search(r'^  name: (\\S+)$', doc, re.M).group(1)
+        own = re.search(r'^  namespace: (\\S+)$', doc, re.M)
+        objects.append((kind.group(1), own.group(1) if own else None, name))
+with open({log!r}, 'a') as log:
+    log.write(json.dumps({{'namespace': namespace, 'objects': objects}}) + '\\n')
+for kind, own, name in objects:
+    if own and namespace and own != namespace:
+        print(f'error: the namespace from the provided object "{{own}}" does not match the namespace '
+              f'"{{namespace}}". You must pass \\'--namespace={{own}}\\' to perform this operation.', file=sys.stderr)
+        sys.exit(1)
+for kind, own, name in objects:
+    print(f'{{kind.lower()}}/{{name}} created')
+'''
+
+
+def load_gui():
+    spec = importlib.util.spec_from_file_location("restore_gui_server", GUI_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_backup(root):
+    """Write <root>/resources/*.yaml and return the directory"""
+    resources = root / 'resources'
+    resources.mkdir(parents=True)
+    for resource_type, objects in BACKUP_RESOURCES.items():
+        items = []
+        for kind, namespace, name in objects:
+            metadata = f"    name: {name}\n" + (f"    namespace: {namespace}\n" if namespace else "")
+            items.append(f"- apiVersion: v1\n  kind: {kind}\n  metadata:\n{metadata}")
+        (resources / f'{resource_type}.yaml').write_text(
+            "apiVersion: v1\nitems:\n" + ''.join(items) + "kind: List\nmetadata:\n  resourceVersion: \"\"\n")
+    return root
+
+
+def check_restore(gui, backup, namespace, log_path, verbose):
+    """Restore a backup through RestoreScheduler; returns a list of failures"""
+    log_path.write_text('')
+    resource_types = [t for _, types in gui.RESTORE_TIERS for t in types]
+    lines, stats = gui.RestoreScheduler(workers=2, timeout=30).run(
+        backup.read_resources(resource_types), namespace, log=print if verbose else None)
+
+    failures = []
+    if not stats['completed'] or stats['errors']:
+        failures.append(f"restore stopped: {stats['errors']} errors, last line {lines[-1]!r}")
+    expected = sum(len(objects) for objects in BACKUP_RESOURCES.values())
+    if stats['success'] != expected:
+        failures.append(f"{stats['success']} of {expected} objects applied")
+
+    for line in log_path.read_text().splitlines():
+        call = json.loads(line)
+        for kind, own, name in call['objects']:
+            if kind in gui.CLUSTER_SCOPED_KINDS and call['namespace'] is not None:
+                failures.append(f"{kind}/{name} applied with --namespace {call['namespace']}")
+            elif kind not in gui.CLUSTER_SCOPED_KINDS and call['namespace'] != (own or namespace):
+                failures.append(f"{own or '-'}/{name} applied with --namespace {call['namespace']}")
+    return failures
+
+
+def main(args):
+    gui = load_gui()
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        log_path = temp / 'kubectl.log'
+        bin_dir = temp / 'bin'
+        bin_dir.mkdir()
+        kubectl = bin_dir / 'kubectl'
+        kubectl.write_text(STAND_IN_KUBECTL.format(python=sys.executable, log=str(log_path)))
+        kubectl.chmod(0o755)
+        os.environ['PATH'] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+
+        source = write_backup(temp / 'k3s-cluster-backup-check')
+        archive = temp / 'k3s-cluster-backup-check.tar.gz'
+        with tarfile.open(archive, 'w:gz') as tar:
+            tar.add(source, arcname=source.name)
+        gui.BACKUP_INDEX = gui.BackupIndex(cache_dir=temp / 'index')
+        store = gui.ObjectStore(temp / 'store')
+        snapshot = store.ingest(source)
+
+        backups = [gui.ArchiveBackup(archive), gui.StoreSnapshot(store, snapshot['id'])]
+        failed = False
+        for backup in backups:
+            failures = check_restore(gui, backup, args.namespace, log_path, args.verbose)
+            status = "✗" if failures else "✓"
+            print(f"{status} {backup.name}: " + ("; ".join(failures) if failures else "all tiers restored"))
+            failed = failed or bool(failures)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check restore-gui-server.py restores multi-namespace backups")
+    parser.add_argument("--namespace", default="insightlearn",
+                        help="Namespace the restore is requested for (default: insightlearn)")
+    parser.add_argument("--verbose", action="store_true", help="Show the restore log")
+    sys.exit(main(parser.parse_args()))
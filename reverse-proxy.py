@@ -4,16 +4,1146 @@ Simple reverse proxy for InsightLearn
 Routes traffic from port 80 to minikube NodePort 31081
 """
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
-import urllib.request
-import urllib.error
+from http.server import HTTPServer, ThreadingHTTPServer, BaseHTTPRequestHandler
+from http import HTTPStatus
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import asyncio
+import http.client
+import json
+import queue
+import random
+import re
+import select
+import socket
+import threading
+import time
 import sys
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
 
 BACKEND_HOST = "192.168.58.2"
 BACKEND_PORT = 31081
 
+# Concurrency limits
+MAX_IN_FLIGHT = 64      # Requests handled in parallel; further requests wait for a slot
+MAX_CONNECTIONS = 512   # Open client connections (threads) before accept() pauses
+ACCEPT_BACKLOG = 128    # Pending connections queued by the kernel meanwhile
+
+# Upstream connection pool
+UPSTREAM_TIMEOUT = 30       # Seconds to wait on the backend
+POOL_SIZE = 32              # Idle keep-alive connections kept per backend
+POOL_IDLE_TIMEOUT = 60      # Seconds an idle connection may be reused
+
+# Load balancing and health checks
+EWMA_ALPHA = 0.3            # Weight of the newest latency sample
+EJECT_AFTER_FAILURES = 3    # Consecutive connection failures before ejection
+EJECT_SECONDS = 30          # How long an ejected backend is skipped
+HEALTH_PATH = "/health"
+HEALTH_INTERVAL = 5         # Seconds between active probes; 0 disables them
+HEALTH_TIMEOUT = 2
+UPSTREAM_ATTEMPTS = 2       # Backends tried for a request without a body
+
+# Streaming
+STREAM_BUFFER = 64 * 1024       # Bytes copied per read/write when relaying bodies
+CLIENT_KEEPALIVE_TIMEOUT = 15   # Seconds a client connection may sit idle
+ASYNC_KEEPALIVE_TIMEOUT = 75    # Idle timeout for the asyncio engine, where idle clients are cheap
+
+# Response cache (disabled unless --cache-size is given)
+CACHE_MAX_BYTES = 0                 # Total cached body bytes; 0 disables the cache
+CACHE_MAX_ENTRY = 32 * 1024 * 1024  # Largest single response kept
+CACHE_DEFAULT_TTL = 300             # Seconds for static assets with validators but no max-age
+STATIC_ASSET_PATTERN = re.compile(
+    r'^/_framework/|\.(wasm|dll|pdb|dat|blat|js|mjs|css|woff2?|ttf|png|jpe?g|gif|svg|ico)$')
+# Headers repeated on a 304 answered from the cache (RFC 7232 section 4.1)
+NOT_MODIFIED_HEADERS = {'cache-control', 'content-location', 'etag', 'expires',
+                        'last-modified', 'vary'}
+
+# Compression of responses the backend sent uncompressed
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+COMPRESS_MIN_SIZE = 1024    # Smaller bodies are not worth the CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(javascript|json|wasm|octet-stream|xml|manifest\+json)$'
+    r'|application/.*\+(json|xml)$|image/svg\+xml$)')
+
+# Structured access log (--access-log json)
+ACCESS_LOG_QUEUE = 10000            # Records buffered before new ones are dropped
+ACCESS_LOG_BATCH = 500              # Records written per batch
+ACCESS_LOG_FLUSH_INTERVAL = 1.0     # Seconds a partial batch may wait
+
+# Internal endpoints answered by the proxy itself (/_proxy/stats, /_proxy/metrics);
+# kept off /metrics so the backend's own Prometheus endpoint stays reachable
+STATUS_PREFIX = "/_proxy/"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Hop-by-hop headers that must not be forwarded (RFC 7230 section 6.1)
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-connection', 'te', 'trailer',
+    'transfer-encoding', 'upgrade',
+}
+
+# Errors raised when a pooled connection was closed by the backend while idle
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError,
+                           BrokenPipeError, http.client.CannotSendRequest)
+
+
+class ConcurrentHTTPServer(ThreadingHTTPServer):
+    """Thread-per-connection server with caps on connections and requests
+
+    When MAX_CONNECTIONS client threads are open the accept loop waits for
+    one to close, so further clients queue in the listen backlog instead of
+    spawning unbounded threads. Within those, at most MAX_IN_FLIGHT requests
+    are served at once: handlers take a slot from request_slots per request
+    (see ProxyHandler.handle_one_request), so idle keep-alive connections do
+    not count against it.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, max_in_flight=MAX_IN_FLIGHT,
+                 max_connections=MAX_CONNECTIONS, accept_backlog=ACCEPT_BACKLOG):
+        self.request_queue_size = accept_backlog
+        self.request_slots = threading.BoundedSemaphore(max_in_flight)
+        self._connections = threading.BoundedSemaphore(max(max_connections, max_in_flight))
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        self._connections.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._connections.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._connections.release()
+
+
+class UpstreamConnection(http.client.HTTPConnection):
+    """HTTPConnection with Nagle disabled, since streamed bodies go out in several writes"""
+
+    def connect(self):
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class UpstreamPool:
+    """Pool of persistent HTTP/1.1 connections to one backend
+
+    Idle connections are reused most-recently-released first. A connection
+    is evicted instead of reused when it has been idle longer than
+    idle_timeout or the backend has already closed its end.
+    """
+
+    def __init__(self, host, port, size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT,
+                 timeout=UPSTREAM_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self):
+        """Return (connection, reused) with a warm connection when available"""
+        now = time.monotonic()
+        stale = []
+        conn = None
+        with self._lock:
+            while self._idle:
+                candidate, released_at = self._idle.pop()
+                if now - released_at > self.idle_timeout or not self._is_healthy(candidate):
+                    self.evictions += 1
+                    stale.append(candidate)
+                    continue
+                conn = candidate
+                self.hits += 1
+                break
+            else:
+                self.misses += 1
+        for candidate in stale:
+            candidate.close()
+        if conn is not None:
+            return conn, True
+        return self.connect(), False
+
+    def connect(self):
+        """Open a new, unpooled connection to the backend"""
+        return UpstreamConnection(self.host, self.port, timeout=self.timeout)
+
+    def release(self, conn, reusable=True):
+        """Return a connection to the pool, or close it"""
+        if reusable and conn.sock is not None:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append((conn, time.monotonic()))
+                    return
+        conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': f"{self.host}:{self.port}",
+                'idle': len(self._idle),
+                'size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    @staticmethod
+    def _is_healthy(conn):
+        """An idle socket that is readable has hit EOF or holds junk"""
+        if conn.sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+
+class AsyncUpstreamPool:
+    """asyncio counterpart of UpstreamPool holding (reader, writer) pairs"""
+
+    def __init__(self, host, port, size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT,
+                 timeout=UPSTREAM_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = deque()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def acquire(self):
+        """Return ((reader, writer), reused) with a warm connection when available"""
+        now = time.monotonic()
+        while self._idle:
+            (reader, writer), released_at = self._idle.pop()
+            if now - released_at > self.idle_timeout or writer.is_closing() or reader.at_eof():
+                self.evictions += 1
+                writer.close()
+                continue
+            self.hits += 1
+            return (reader, writer), True
+        self.misses += 1
+        return await self.connect(), False
+
+    async def connect(self):
+        """Open a new, unpooled connection to the backend"""
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, limit=STREAM_BUFFER),
+            self.timeout)
+
+    def release(self, conn, reusable=True):
+        """Return a connection to the pool, or close it"""
+        reader, writer = conn
+        if reusable and not writer.is_closing() and len(self._idle) < self.size:
+            self._idle.append((conn, time.monotonic()))
+            return
+        writer.close()
+
+    def stats(self):
+        return {
+            'backend': f"{self.host}:{self.port}",
+            'idle': len(self._idle),
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class Backend:
+    """One upstream replica: its connection pools and load-balancing state"""
+
+    def __init__(self, host, port, pool_size=POOL_SIZE, pool_idle_timeout=POOL_IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.pool = UpstreamPool(host, port, size=pool_size, idle_timeout=pool_idle_timeout)
+        self.async_pool = AsyncUpstreamPool(host, port, size=pool_size,
+                                            idle_timeout=pool_idle_timeout)
+        self.active = 0
+        self.ewma = 0.0
+        self.healthy = True
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+    def available(self, now):
+        return self.healthy and now >= self.ejected_until
+
+    def stats(self):
+        return {
+            'backend': self.name,
+            'healthy': self.healthy,
+            'ejected': time.monotonic() < self.ejected_until,
+            'active': self.active,
+            'requests': self.requests,
+            'ewma_ms': round(self.ewma * 1000, 2),
+            'pool': self.pool.stats(),
+            'async_pool': self.async_pool.stats(),
+        }
+
+
+class LoadBalancer:
+    """Spreads requests over backends that are healthy and not ejected
+
+    Strategies: round-robin, least-conn (fewest active requests) and ewma
+    (lowest response-time EWMA weighted by active requests). Backends
+    failing eject_after requests in a row are ejected for eject_seconds.
+    When nothing is available every backend is tried rather than none.
+    """
+
+    strategies = ('round-robin', 'least-conn', 'ewma')
+
+    def __init__(self, backends, strategy='round-robin', eject_after=EJECT_AFTER_FAILURES,
+                 eject_seconds=EJECT_SECONDS):
+        if strategy not in self.strategies:
+            raise ValueError(f"unknown balancing strategy: {strategy}")
+        self.backends = list(backends)
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def choose(self, exclude=()):
+        """Pick a backend and count the request as active on it"""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [b for b in self.backends if b not in exclude and b.available(now)]
+            if not candidates:
+                candidates = [b for b in self.backends if b not in exclude] or self.backends
+            if self.strategy == 'least-conn':
+                backend = min(candidates, key=lambda b: b.active)
+            elif self.strategy == 'ewma':
+                backend = min(candidates, key=lambda b: (b.ewma + 0.001) * (b.active + 1))
+            else:
+                backend = candidates[self._next % len(candidates)]
+                self._next += 1
+            backend.active += 1
+            backend.requests += 1
+            return backend
+
+    def observe(self, backend, latency):
+        """Fold a time-to-response-headers sample into the backend's EWMA"""
+        with self._lock:
+            backend.ewma = latency if backend.ewma == 0.0 else \
+                EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * backend.ewma
+
+    def release(self, backend, failed=False):
+        """Finish a request started with choose()"""
+        with self._lock:
+            backend.active -= 1
+            if not failed:
+                backend.failures = 0
+                return
+            backend.failures += 1
+            if backend.failures >= self.eject_after:
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+                backend.failures = 0
+                print(f"Backend {backend.name} ejected for {self.eject_seconds}s", file=sys.stderr)
+
+    def stats(self):
+        with self._lock:
+            return [backend.stats() for backend in self.backends]
+
+
+class HealthChecker(threading.Thread):
+    """Background thread probing each backend's health endpoint"""
+
+    def __init__(self, balancer, path=HEALTH_PATH, interval=HEALTH_INTERVAL,
+                 timeout=HEALTH_TIMEOUT):
+        super().__init__(name="health-checker", daemon=True)
+        self.balancer = balancer
+        self.path = path
+        self.interval = interval
+        self.timeout = timeout
+
+    def run(self):
+        while True:
+            for backend in self.balancer.backends:
+                healthy = self.probe(backend)
+                if healthy != backend.healthy:
+                    state = "healthy" if healthy else "unhealthy"
+                    print(f"Backend {backend.name} is {state}", file=sys.stderr)
+                backend.healthy = healthy
+            time.sleep(self.interval)
+
+    def probe(self, backend):
+        conn = http.client.HTTPConnection(backend.host, backend.port, timeout=self.timeout)
+        try:
+            conn.request('GET', self.path)
+            response = conn.getresponse()
+            response.read()
+            return 200 <= response.status < 400
+        except (OSError, http.client.HTTPException):
+            return False
+        finally:
+            conn.close()
+
+
+def parse_backend(value):
+    """argparse type for HOST:PORT"""
+    host, _, port = value.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"expected HOST:PORT, got {value!r}")
+    return host, int(port)
+
+
+BALANCER = LoadBalancer([Backend(BACKEND_HOST, BACKEND_PORT)])
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick the preferred supported coding from Accept-Encoding, or None for identity"""
+    offered = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            offered[coding.strip().lower()] = quality
+    for coding in SUPPORTED_ENCODINGS:
+        if offered.get(coding, offered.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+def plan_compression(method, request_headers, status, headers):
+    """Return (compressible, coding) for a backend response
+
+    compressible means the representation depends on Accept-Encoding and
+    must carry Vary; coding is what this client gets (None for identity).
+    """
+    if method != 'GET' or status != 200:
+        return False, None
+    values = {}
+    for name, value in headers:
+        values.setdefault(name.lower(), value)
+    if values.get('content-encoding', 'identity').lower() != 'identity':
+        return False, None
+    if 'no-transform' in values.get('cache-control', '').lower():
+        return False, None
+    content_type = values.get('content-type', '').split(';', 1)[0].strip().lower()
+    if not COMPRESSIBLE_TYPES.match(content_type):
+        return False, None
+    try:
+        if int(values.get('content-length', COMPRESS_MIN_SIZE)) < COMPRESS_MIN_SIZE:
+            return False, None
+    except ValueError:
+        return False, None
+    return True, negotiate_encoding(request_headers.get('accept-encoding', ''))
+
+
+def compressed_headers(headers, coding):
+    """Headers for a compressible response: Vary added, and rewritten when coding is set"""
+    result = []
+    vary = []
+    for name, value in headers:
+        lower = name.lower()
+        if lower == 'vary':
+            vary.extend(field.strip() for field in value.split(',') if field.strip())
+            continue
+        if coding is not None:
+            if lower == 'content-length':
+                continue
+            if lower == 'etag' and not value.startswith('W/'):
+                # A different byte representation must not share a strong validator
+                value = 'W/' + value
+        result.append((name, value))
+    if 'accept-encoding' not in (field.lower() for field in vary):
+        vary.append('Accept-Encoding')
+    result.append(('Vary', ', '.join(vary)))
+    if coding is not None:
+        result.append(('Content-Encoding', coding))
+    return result
+
+
+class StreamEncoder:
+    """Incremental gzip or Brotli compressor"""
+
+    def __init__(self, coding):
+        if coding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress = self._compressor.process
+            self.flush = self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress = self._compressor.compress
+            self.flush = self._compressor.flush
+
+
+class BodySink:
+    """Writes a relayed body: optional compression, chunk framing and cache capture"""
+
+    def __init__(self, stream, rechunk=False, encoder=None, capture=None):
+        self.stream = stream
+        self.rechunk = rechunk
+        self.encoder = encoder
+        self.capture = capture
+        self.bytes = 0
+
+    def write(self, data):
+        if self.encoder is not None:
+            data = self.encoder.compress(data)
+        self._emit(data)
+
+    def finish(self):
+        if self.encoder is not None:
+            self._emit(self.encoder.flush())
+        if self.rechunk:
+            self.stream.write(b"0\r\n\r\n")
+
+    def _emit(self, data):
+        # An empty chunk would end a chunked body early
+        if not data:
+            return
+        self.bytes += len(data)
+        if self.capture is not None:
+            self.capture.add(data)
+        if self.rechunk:
+            self.stream.write(b"%x\r\n%b\r\n" % (len(data), data))
+        else:
+            self.stream.write(data)
+
+
+class CacheEntry:
+    """A complete cached response plus the validators needed for 304s"""
+
+    __slots__ = ('status', 'headers', 'body', 'etag', 'last_modified', 'stored_at', 'expires')
+
+    def __init__(self, status, headers, body, ttl):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = None
+        self.last_modified = None
+        for name, value in headers:
+            if name.lower() == 'etag':
+                self.etag = value
+            elif name.lower() == 'last-modified':
+                self.last_modified = value
+        self.stored_at = time.time()
+        self.expires = self.stored_at + ttl
+
+    def response_headers(self, not_modified=False):
+        """Headers to send for a hit, with Age; 304s carry only metadata"""
+        age = str(int(time.time() - self.stored_at))
+        if not_modified:
+            headers = [(name, value) for name, value in self.headers
+                       if name.lower() in NOT_MODIFIED_HEADERS]
+        else:
+            headers = list(self.headers)
+        headers.append(('Age', age))
+        return headers
+
+    def not_modified(self, request_headers):
+        """True when the client's conditional headers match this entry"""
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match is not None:
+            if self.etag is None:
+                return False
+            if if_none_match.strip() == '*':
+                return True
+            wanted = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            return self.etag.removeprefix('W/') in wanted
+        if_modified_since = request_headers.get('if-modified-since')
+        if if_modified_since and self.last_modified:
+            try:
+                return parsedate_to_datetime(self.last_modified) <= \
+                    parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class BodyCapture:
+    """Collects a streamed body for the cache, giving up past a size limit"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+
+    def add(self, data):
+        if self.parts is None:
+            return
+        self.size += len(data)
+        if self.size > self.limit:
+            self.parts = None
+        else:
+            self.parts.append(data)
+
+    def body(self):
+        return None if self.parts is None else b''.join(self.parts)
+
+
+class ResponseCache:
+    """In-memory LRU cache of GET responses bounded by total body size
+
+    Only responses the backend marks as shareable are kept: 200s without
+    no-store/private/no-cache, Set-Cookie or Vary: *. Freshness comes from
+    s-maxage/max-age/Expires; static assets (see STATIC_ASSET_PATTERN)
+    that only carry an ETag or Last-Modified are kept for default_ttl.
+    Request headers are looked up with lowercase names.
+    """
+
+    def __init__(self, max_bytes, max_entry_bytes=CACHE_MAX_ENTRY, default_ttl=CACHE_DEFAULT_TTL):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._vary = {}         # path -> request headers named by Vary
+        self._variants = {}     # path -> cache keys stored for it
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def lookup(self, path, request_headers):
+        """Return a fresh CacheEntry for this request, or None"""
+        if self._bypass(request_headers):
+            return None
+        now = time.time()
+        with self._lock:
+            key = self._key(path, request_headers)
+            entry = self._entries.get(key)
+            if entry is None or entry.expires <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def freshness(self, path, request_headers, status, headers):
+        """Seconds the response may be served from cache, or None if not storable"""
+        if status != 200 or self._bypass(request_headers):
+            return None
+        values = {}
+        for name, value in headers:
+            values.setdefault(name.lower(), value)
+        if 'set-cookie' in values or values.get('vary', '').strip() == '*':
+            return None
+        directives = {}
+        for part in values.get('cache-control', '').split(','):
+            name, _, arg = part.strip().partition('=')
+            if name:
+                directives[name.lower()] = arg.strip('"')
+        if {'no-store', 'private', 'no-cache'} & directives.keys():
+            return None
+
+        ttl = None
+        for directive in ('s-maxage', 'max-age'):
+            if directive in directives:
+                try:
+                    ttl = int(directives[directive])
+                except ValueError:
+                    return None
+                break
+        if ttl is None and 'expires' in values:
+            try:
+                ttl = parsedate_to_datetime(values['expires']).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        if ttl is None and ('etag' in values or 'last-modified' in values) and \
+                STATIC_ASSET_PATTERN.search(path.split('?', 1)[0]):
+            ttl = self.default_ttl
+        if ttl is None:
+            return None
+        try:
+            ttl -= int(values.get('age', 0))
+        except ValueError:
+            pass
+        return ttl if ttl > 0 else None
+
+    def store(self, path, request_headers, status, headers, body, ttl):
+        """Keep a complete response, evicting least recently used entries
+
+        Returns the stored CacheEntry, or None when the body is too large.
+        """
+        if len(body) > self.max_entry_bytes:
+            return None
+        stored_headers = [(name, value) for name, value in headers
+                          if name.lower() not in HOP_BY_HOP_HEADERS
+                          and name.lower() not in ('content-length', 'age')]
+        stored_headers.append(('Content-Length', str(len(body))))
+        vary = set()
+        for name, value in headers:
+            if name.lower() == 'vary':
+                vary.update(field.strip().lower() for field in value.split(',') if field.strip())
+        vary = tuple(sorted(vary))
+        entry = CacheEntry(status, stored_headers, body, ttl)
+        with self._lock:
+            if self._vary.get(path, vary) != vary:
+                # The variant set changed; drop variants keyed the old way
+                for key in list(self._variants.get(path, ())):
+                    self._remove(key)
+            self._vary[path] = vary
+            key = self._key(path, request_headers)
+            if key in self._entries:
+                self._remove(key)
+                self._vary[path] = vary
+            self._entries[key] = entry
+            self._variants.setdefault(path, set()).add(key)
+            self.bytes += len(body)
+            self.stores += 1
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return entry
+
+    def variant_key(self, path, request_headers):
+        """Cache key of this request given the Vary fields learned so far"""
+        with self._lock:
+            return self._key(path, request_headers)
+
+    def flight_key(self, path, request_headers):
+        """Key identical concurrent GETs are coalesced on, or None to bypass
+
+        The negotiated coding is always part of it because the proxy may
+        compress the response itself before the backend's Vary is known.
+        """
+        if self._bypass(request_headers):
+            return None
+        coding = negotiate_encoding(request_headers.get('accept-encoding', '')) or 'identity'
+        return self.variant_key(path, request_headers), coding
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+            }
+
+    def _key(self, path, request_headers):
+        names = self._vary.get(path, ())
+        return (path, tuple(self._vary_value(name, request_headers) for name in names))
+
+    @staticmethod
+    def _vary_value(name, request_headers):
+        """Accept-Encoding is keyed by the negotiated coding, not the raw header"""
+        value = request_headers.get(name, '')
+        if name == 'accept-encoding':
+            return negotiate_encoding(value) or 'identity'
+        return value
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= len(entry.body)
+        variants = self._variants[key[0]]
+        variants.discard(key)
+        if not variants:
+            del self._variants[key[0]]
+            self._vary.pop(key[0], None)
+
+    @staticmethod
+    def _bypass(request_headers):
+        """Authenticated or explicitly uncached requests never touch the cache"""
+        if request_headers.get('authorization') is not None:
+            return True
+        cache_control = request_headers.get('cache-control', '').lower()
+        return 'no-cache' in cache_control or 'no-store' in cache_control or \
+            'no-cache' in request_headers.get('pragma', '').lower()
+
+
+RESPONSE_CACHE = None
+
+
+class Flight:
+    """One upstream fetch in progress that identical requests wait on"""
+
+    __slots__ = ('key', 'done', 'entry', 'variant')
+
+    def __init__(self, key, done):
+        self.key = key
+        self.done = done
+        self.entry = None
+        self.variant = None
+
+
+class Coalescer:
+    """Single-flight table for cacheable GETs
+
+    The first request for a ResponseCache.flight_key() goes upstream as the
+    leader; identical requests arriving meanwhile wait on its Flight and
+    are answered with the entry the leader stored. When the response turns
+    out not to be cacheable, or the leader fails, waiters go upstream
+    themselves. event_factory is threading.Event or asyncio.Event to match
+    the serving engine.
+    """
+
+    def __init__(self, event_factory, wait_timeout=UPSTREAM_TIMEOUT):
+        self.event_factory = event_factory
+        self.wait_timeout = wait_timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.fallbacks = 0
+
+    def join(self, key):
+        """Return (flight, leader); the leader must call finish(flight)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Flight(key, self.event_factory())
+            self.leaders += 1
+            return flight, True
+
+    def finish(self, flight):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight.done.set()
+
+    def result(self, flight, variant):
+        """Entry for a waiter whose cache key is variant, or None to go upstream"""
+        with self._lock:
+            if flight.entry is not None and flight.variant == variant:
+                self.coalesced += 1
+                return flight.entry
+            self.fallbacks += 1
+            return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'fallbacks': self.fallbacks,
+            }
+
+
+COALESCER = None
+
+
+class Histogram:
+    """Prometheus-style histogram with fixed bucket bounds"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, lines):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum {self.sum:.6f}')
+        lines.append(f'{name}_count {self.count}')
+
+
+class ProxyMetrics:
+    """Request counters and latency histograms exposed at /_proxy/metrics
+
+    Updates are a few integer operations under one lock; rendering reads
+    the pool, balancer and cache counters only when Prometheus scrapes.
+    """
+
+    methods = ('GET', 'POST', 'PUT', 'DELETE', 'HEAD', 'OPTIONS')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.errors = {500: 0, 502: 0}
+        self.in_flight = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.upstream_latency = Histogram(LATENCY_BUCKETS)
+        self.request_duration = Histogram(LATENCY_BUCKETS)
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, method, status, seconds, bytes_in, bytes_out):
+        if method not in self.methods:
+            method = 'OTHER'
+        key = (method, status)
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.request_duration.observe(seconds)
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def proxy_error(self, status):
+        """Count an error response the proxy generated itself (not one relayed from a backend)"""
+        if status in self.errors:
+            with self._lock:
+                self.errors[status] += 1
+
+    def observe_upstream(self, seconds):
+        with self._lock:
+            self.upstream_latency.observe(seconds)
+
+    def render(self, balancer, cache=None):
+        """Prometheus text exposition format 0.0.4"""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family("insightlearn_proxy_requests_total", "counter",
+                   "Requests answered by the proxy by method and status")
+            for (method, status), count in sorted(self.requests.items()):
+                lines.append(f'insightlearn_proxy_requests_total{{method="{method}",status="{status}"}} {count}')
+            family("insightlearn_proxy_errors_total", "counter",
+                   "Errors generated by the proxy itself (502 backend unavailable, 500 internal)")
+            for status, count in sorted(self.errors.items()):
+                lines.append(f'insightlearn_proxy_errors_total{{code="{status}"}} {count}')
+            family("insightlearn_proxy_in_flight_requests", "gauge", "Requests currently being served")
+            lines.append(f"insightlearn_proxy_in_flight_requests {self.in_flight}")
+            family("insightlearn_proxy_received_bytes_total", "counter", "Request body bytes received from clients")
+            lines.append(f"insightlearn_proxy_received_bytes_total {self.bytes_in}")
+            family("insightlearn_proxy_sent_bytes_total", "counter", "Response body bytes sent to clients")
+            lines.append(f"insightlearn_proxy_sent_bytes_total {self.bytes_out}")
+            family("insightlearn_proxy_upstream_latency_seconds", "histogram",
+                   "Time from choosing a backend to receiving its response headers")
+            self.upstream_latency.render("insightlearn_proxy_upstream_latency_seconds", lines)
+            family("insightlearn_proxy_request_duration_seconds", "histogram",
+                   "Total time spent serving a request, including streaming the body")
+            self.request_duration.render("insightlearn_proxy_request_duration_seconds", lines)
+
+        backends = balancer.stats()
+        family("insightlearn_proxy_backend_up", "gauge", "Backend healthy and not ejected (1=yes, 0=no)")
+        for backend in backends:
+            up = int(backend['healthy'] and not backend['ejected'])
+            lines.append(f'insightlearn_proxy_backend_up{{backend="{backend["backend"]}"}} {up}')
+        family("insightlearn_proxy_backend_active_requests", "gauge", "Requests in progress per backend")
+        for backend in backends:
+            lines.append(f'insightlearn_proxy_backend_active_requests{{backend="{backend["backend"]}"}} '
+                         f'{backend["active"]}')
+        for counter, help_text in (('hits', "Requests that reused a pooled upstream connection"),
+                                   ('misses', "Requests that opened a new upstream connection")):
+            family(f"insightlearn_proxy_pool_{counter}_total", "counter", help_text)
+            for backend in backends:
+                value = backend['pool'][counter] + backend['async_pool'][counter]
+                lines.append(f'insightlearn_proxy_pool_{counter}_total{{backend="{backend["backend"]}"}} {value}')
+
+        if cache is not None:
+            stats = cache.stats()
+            family("insightlearn_proxy_cache_hits_total", "counter", "Responses served from the cache")
+            lines.append(f"insightlearn_proxy_cache_hits_total {stats['hits']}")
+            family("insightlearn_proxy_cache_misses_total", "counter", "Cacheable requests sent to a backend")
+            lines.append(f"insightlearn_proxy_cache_misses_total {stats['misses']}")
+            family("insightlearn_proxy_cache_bytes", "gauge", "Body bytes held in the cache")
+            lines.append(f"insightlearn_proxy_cache_bytes {stats['bytes']}")
+
+        if COALESCER is not None:
+            stats = COALESCER.stats()
+            family("insightlearn_proxy_coalesced_requests_total", "counter",
+                   "GETs answered from another request's in-flight upstream fetch")
+            lines.append(f"insightlearn_proxy_coalesced_requests_total {stats['coalesced']}")
+
+        if ACCESS_LOG is not None:
+            stats = ACCESS_LOG.stats()
+            family("insightlearn_proxy_access_log_written_total", "counter", "Access log records written")
+            lines.append(f"insightlearn_proxy_access_log_written_total {stats['written']}")
+            family("insightlearn_proxy_access_log_dropped_total", "counter",
+                   "Access log records dropped because the write queue was full")
+            lines.append(f"insightlearn_proxy_access_log_dropped_total {stats['dropped']}")
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = ProxyMetrics()
+
+
+class AccessLog:
+    """JSON-lines access log written by a background thread
+
+    log() only samples the record and puts it on a bounded queue; the
+    writer thread serialises records in batches. When the queue is full
+    records are dropped and counted instead of blocking the request.
+    Responses with status >= 500 are never sampled out.
+    """
+
+    def __init__(self, stream, sample_rate=1.0, queue_size=ACCESS_LOG_QUEUE,
+                 batch_size=ACCESS_LOG_BATCH, flush_interval=ACCESS_LOG_FLUSH_INTERVAL):
+        self.stream = stream
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name="access-log", daemon=True)
+        self._thread.start()
+
+    def log(self, record):
+        if self.sample_rate < 1.0 and record.get('status', 0) < 500 and \
+                random.random() >= self.sample_rate:
+            with self._lock:
+                self.sampled_out += 1
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def close(self, timeout=5):
+        """Flush queued records and stop the writer"""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'sampled_out': self.sampled_out,
+            }
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    record = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch):
+        lines = []
+        for record in batch:
+            record['ts'] = datetime.fromtimestamp(record['ts'], timezone.utc) \
+                .isoformat(timespec='milliseconds')
+            lines.append(json.dumps(record, separators=(',', ':')))
+        try:
+            self.stream.write('\n'.join(lines) + '\n')
+            self.stream.flush()
+        except (OSError, ValueError) as e:
+            print(f"Access log write failed: {e}", file=sys.stderr)
+        with self._lock:
+            self.written += len(batch)
+
+
+ACCESS_LOG = None
+
+
+def ms(seconds):
+    """Seconds to rounded milliseconds for access log fields"""
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def render_status(path, balancer, cache=None, **extra):
+    """Body for an internal /_proxy/ endpoint as (content type, payload), or None"""
+    if path == STATUS_PREFIX + 'stats':
+        status = {'backends': balancer.stats(), **extra}
+        if cache is not None:
+            status['cache'] = cache.stats()
+        if COALESCER is not None:
+            status['coalescing'] = COALESCER.stats()
+        if ACCESS_LOG is not None:
+            status['access_log'] = ACCESS_LOG.stats()
+        return 'application/json', json.dumps(status).encode()
+    if path == STATUS_PREFIX + 'metrics':
+        return 'text/plain; version=0.0.4', METRICS.render(balancer, cache).encode()
+    return None
+
+
 class ProxyHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 is needed to relay chunked responses and keep clients connected
+    protocol_version = "HTTP/1.1"
+    timeout = CLIENT_KEEPALIVE_TIMEOUT
+    # Headers and body are separate writes; with Nagle on, small responses
+    # wait for the client's delayed ACK (~40 ms) on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def handle_one_request(self):
+        self._slot = None
+        try:
+            super().handle_one_request()
+        finally:
+            if self._slot is not None:
+                self._slot.release()
+
+    def parse_request(self):
+        # Runs once a request line has arrived, so the in-flight slot covers
+        # this request only and not the keep-alive wait for the next one
+        slots = getattr(self.server, 'request_slots', None)
+        if slots is not None:
+            slots.acquire()
+            self._slot = slots
+        return super().parse_request()
+
     def do_GET(self):
+        if self.path.startswith(STATUS_PREFIX):
+            self.send_status()
+            return
         self.proxy_request()
 
     def do_POST(self):
@@ -31,76 +1161,880 @@ class ProxyHandler(BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         self.proxy_request()
 
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
+
     def proxy_request(self):
+        self._status = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._sink = None
+        self._timing = {}
+        METRICS.start()
+        received_at = time.time()
+        started = time.monotonic()
+        try:
+            self._proxy_request()
+        finally:
+            total = time.monotonic() - started
+            bytes_out = self._bytes_out + (self._sink.bytes if self._sink is not None else 0)
+            METRICS.finish(self.command, self._status, total, self._bytes_in, bytes_out)
+            if ACCESS_LOG is not None:
+                ACCESS_LOG.log({
+                    'ts': received_at,
+                    'client': self.client_address[0],
+                    'method': self.command,
+                    'path': self.path,
+                    'status': self._status,
+                    'bytes_in': self._bytes_in,
+                    'bytes_out': bytes_out,
+                    'backend': self._timing.get('backend'),
+                    'cache': self._timing.get('cache'),
+                    'connect_ms': ms(self._timing.get('connect')),
+                    'ttfb_ms': ms(self._timing.get('ttfb')),
+                    'total_ms': ms(total),
+                    'user_agent': self.headers.get('User-Agent'),
+                })
+
+    def _proxy_request(self):
+        self._flight = None
+        if RESPONSE_CACHE is not None and self.command in ('GET', 'HEAD'):
+            entry = RESPONSE_CACHE.lookup(self.path, self.headers)
+            self._timing['cache'] = 'miss' if entry is None else 'hit'
+            if entry is None and self.command == 'GET' and COALESCER is not None:
+                entry = self._join_flight()
+            if entry is not None:
+                self._send_cached(entry)
+                return
         try:
-            # Build backend URL
-            backend_url = f"http://{BACKEND_HOST}:{BACKEND_PORT}{self.path}"
+            self._forward_request()
+        finally:
+            if self._flight is not None:
+                COALESCER.finish(self._flight)
+
+    def _join_flight(self):
+        """Lead or wait on the single flight for this GET; return a shared entry or None"""
+        key = RESPONSE_CACHE.flight_key(self.path, self.headers)
+        if key is None:
+            return None
+        flight, leader = COALESCER.join(key)
+        if leader:
+            self._flight = flight
+            return None
+        flight.done.wait(COALESCER.wait_timeout)
+        entry = COALESCER.result(flight, RESPONSE_CACHE.variant_key(self.path, self.headers))
+        if entry is not None:
+            self._timing['cache'] = 'coalesced'
+        return entry
 
-            # Prepare headers
+    def _forward_request(self):
+        conn = None
+        self._response_started = False
+        try:
+            # Prepare headers (Expect is answered by this server, not the backend)
             headers = {}
             for header, value in self.headers.items():
-                if header.lower() not in ['host', 'connection']:
+                name = header.lower()
+                if name not in ('host', 'expect') and name not in HOP_BY_HOP_HEADERS:
                     headers[header] = value
 
-            # Get request body for POST/PUT
-            content_length = self.headers.get('Content-Length')
-            body = None
-            if content_length:
-                body = self.rfile.read(int(content_length))
-
-            # Make request to backend
-            req = urllib.request.Request(
-                backend_url,
-                data=body,
-                headers=headers,
-                method=self.command
-            )
-
-            with urllib.request.urlopen(req, timeout=30) as response:
-                # Send response status
-                self.send_response(response.status)
-
-                # Send response headers
-                for header, value in response.headers.items():
-                    if header.lower() not in ['connection', 'transfer-encoding']:
-                        self.send_header(header, value)
-                self.end_headers()
-
-                # Send response body
-                self.wfile.write(response.read())
-
-        except urllib.error.HTTPError as e:
-            self.send_response(e.code)
-            self.end_headers()
-            self.wfile.write(e.read())
-
-        except urllib.error.URLError as e:
+            # Stream the request body for POST/PUT instead of buffering it
+            body, encode_chunked = self._request_body()
+
+            # Make request to a backend over a pooled keep-alive connection
+            backend, conn, response = self._open_upstream(body, headers, encode_chunked)
+            try:
+                self._relay_response(response)
+            finally:
+                BALANCER.release(backend)
+            backend.pool.release(conn, reusable=not response.will_close)
+
+        except MalformedBodyError as e:
+            print(f"Malformed request body: {e}", file=sys.stderr)
+            self._send_plain(400, b"400 Bad Request - Malformed request body\n")
+
+        except ClientBodyError as e:
+            # The client broke off its own upload; there is no one left to answer
+            print(f"Client request body failed: {e}", file=sys.stderr)
+            self.close_connection = True
+
+        except (OSError, http.client.HTTPException) as e:
+            if conn is not None:
+                conn.close()
+            if self._response_started:
+                # Headers already went out; all we can do is drop the client
+                print(f"Stream aborted: {e}", file=sys.stderr)
+                self.close_connection = True
+                return
             print(f"Backend connection failed: {e}", file=sys.stderr)
-            self.send_response(502)
-            self.send_header('Content-Type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b"502 Bad Gateway - Backend unavailable\n")
+            self._send_plain(502, b"502 Bad Gateway - Backend unavailable\n")
 
         except Exception as e:
+            if conn is not None:
+                conn.close()
             print(f"Proxy error: {e}", file=sys.stderr)
-            self.send_response(500)
-            self.send_header('Content-Type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b"500 Internal Server Error\n")
+            if self._response_started:
+                self.close_connection = True
+                return
+            self._send_plain(500, b"500 Internal Server Error\n")
+
+    def _request_body(self):
+        """Return (iterable body or None, encode_chunked) for the client request"""
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            return self._client_body(self._iter_chunked_body()), True
+        content_length = self.headers.get('Content-Length')
+        if content_length:
+            try:
+                length = int(content_length)
+            except ValueError:
+                raise MalformedBodyError(f"invalid Content-Length {content_length!r}") from None
+            return self._client_body(self._iter_body(length)), False
+        return None, False
+
+    def _client_body(self, chunks):
+        """Raise client read failures as ClientBodyError so they are not blamed on the backend"""
+        try:
+            yield from chunks
+        except ValueError as e:
+            raise MalformedBodyError(str(e)) from e
+        except OSError as e:
+            raise ClientBodyError(str(e) or type(e).__name__) from e
+
+    def _iter_body(self, length):
+        """Yield a Content-Length request body in STREAM_BUFFER pieces"""
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(STREAM_BUFFER, remaining))
+            if not chunk:
+                raise ConnectionError("client closed connection mid-body")
+            remaining -= len(chunk)
+            self._bytes_in += len(chunk)
+            yield chunk
+
+    def _iter_chunked_body(self):
+        """Decode a chunked request body; http.client re-chunks it upstream"""
+        while True:
+            size_line = self.rfile.readline(1024)
+            if not size_line:
+                raise ConnectionError("client closed connection mid-body")
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                break
+            yield from self._iter_body(size)
+            self.rfile.readline(1024)  # CRLF after chunk data
+        # Skip trailer fields up to the terminating blank line
+        while self.rfile.readline(1024) not in (b'\r\n', b'\n', b''):
+            pass
+
+    def _relay_response(self, response):
+        """Stream the backend response to the client with a fixed-size buffer"""
+        headers = response.getheaders()
+        compressible, coding = plan_compression(self.command, self.headers,
+                                                response.status, headers)
+        if compressible:
+            headers = compressed_headers(headers, coding)
+
+        self.send_response(response.status)
+        content_length = None
+        for header, value in headers:
+            if header.lower() not in HOP_BY_HOP_HEADERS:
+                self.send_header(header, value)
+            if header.lower() == 'content-length':
+                content_length = value
+
+        has_body = (self.command != 'HEAD' and response.status not in (204, 304)
+                    and response.status >= 200)
+        chunked = False
+        if has_body and content_length is None:
+            if self.request_version == 'HTTP/1.1':
+                self.send_header('Transfer-Encoding', 'chunked')
+                chunked = True
+            else:
+                # HTTP/1.0 clients read an unsized body until the connection closes
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+        self.end_headers()
+        self._response_started = True
+
+        if not has_body:
+            response.read()
+            return
+
+        ttl = None
+        if RESPONSE_CACHE is not None and self.command == 'GET':
+            ttl = RESPONSE_CACHE.freshness(self.path, self.headers, response.status, headers)
+        capture = BodyCapture(RESPONSE_CACHE.max_entry_bytes) if ttl else None
+        sink = BodySink(self.wfile, rechunk=chunked, capture=capture,
+                        encoder=StreamEncoder(coding) if coding else None)
+        self._sink = sink
+
+        while True:
+            data = response.read1(STREAM_BUFFER)
+            if not data:
+                # read1() leaves a fully-read sized body open; close it so the
+                # connection can go back to the pool
+                response.close()
+                break
+            sink.write(data)
+        sink.finish()
+
+        if capture is not None and capture.body() is not None:
+            entry = RESPONSE_CACHE.store(self.path, self.headers, response.status,
+                                         headers, capture.body(), ttl)
+            if self._flight is not None:
+                self._flight.entry = entry
+                self._flight.variant = RESPONSE_CACHE.variant_key(self.path, self.headers)
+
+    def _send_cached(self, entry):
+        """Answer from the response cache, with 304 for matching validators"""
+        not_modified = entry.not_modified(self.headers)
+        self.send_response(304 if not_modified else entry.status)
+        for header, value in entry.response_headers(not_modified):
+            self.send_header(header, value)
+        self.end_headers()
+        if not not_modified and self.command != 'HEAD':
+            self.wfile.write(entry.body)
+            self._bytes_out = len(entry.body)
+
+    def _open_upstream(self, body, headers, encode_chunked):
+        """Send the request to a backend and return (backend, conn, response)
+
+        The caller must BALANCER.release() the backend once done. Requests
+        without a body move on to another backend when the first one cannot
+        be reached.
+        """
+        tried = []
+        while True:
+            backend = BALANCER.choose(exclude=tried)
+            tried.append(backend)
+            self._timing['backend'] = backend.name
+            started = time.monotonic()
+            try:
+                conn, reused = backend.pool.acquire()
+                if not reused:
+                    conn.connect()
+                    self._timing['connect'] = time.monotonic() - started
+                try:
+                    response = self._send_upstream(conn, body, headers, encode_chunked)
+                except STALE_CONNECTION_ERRORS:
+                    if not reused or body is not None:
+                        raise
+                    # The backend dropped an idle connection; retry once on a fresh one
+                    conn = backend.pool.connect()
+                    response = self._send_upstream(conn, body, headers, encode_chunked)
+            except ClientBodyError:
+                BALANCER.release(backend)
+                raise
+            except (OSError, http.client.HTTPException):
+                BALANCER.release(backend, failed=True)
+                if body is not None or len(tried) >= min(len(BALANCER.backends), UPSTREAM_ATTEMPTS):
+                    raise
+                continue
+            except BaseException:
+                BALANCER.release(backend)
+                raise
+            self._timing['ttfb'] = time.monotonic() - started
+            BALANCER.observe(backend, self._timing['ttfb'])
+            METRICS.observe_upstream(self._timing['ttfb'])
+            return backend, conn, response
+
+    def _send_upstream(self, conn, body, headers, encode_chunked=False):
+        """Send the request on conn and return the backend response"""
+        try:
+            conn.request(self.command, self.path, body=body, headers=headers,
+                         encode_chunked=encode_chunked)
+            return conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+    def _send_plain(self, status, message):
+        """Send a short text/plain error and close the client connection"""
+        METRICS.proxy_error(status)
+        self.close_connection = True
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(message)))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(message)
+
+    def send_status(self):
+        """Answer /_proxy/stats and /_proxy/metrics with the proxy's own counters"""
+        result = render_status(self.path, BALANCER, RESPONSE_CACHE)
+        if result is None:
+            self.send_error(404, "Not Found")
+            return
+        content_type, payload = result
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_request(self, code='-', size='-'):
+        # The structured access log replaces the per-request text line
+        if ACCESS_LOG is None:
+            super().log_request(code, size)
 
     def log_message(self, format, *args):
         """Custom logging"""
         print(f"{self.address_string()} - [{self.log_date_time_string()}] {format % args}")
 
+
+class ClientBodyError(Exception):
+    """The client's request body broke off mid-upload (not a backend failure)"""
+
+
+class MalformedBodyError(ClientBodyError):
+    """The client's request body could not be parsed (mapped to 400)"""
+
+
+class UpstreamError(Exception):
+    """The backend could not be reached or broke the HTTP exchange (mapped to 502)"""
+
+
+class AsyncProxyServer:
+    """Event-loop implementation of ProxyHandler
+
+    Each client connection is a coroutine rather than a thread, so idle
+    browser keep-alive connections cost a few kilobytes each. Header
+    filtering, the accepted verbs and the 502/500 error mapping match
+    ProxyHandler; only proxying itself is bounded by max_in_flight.
+    """
+
+    methods = ('GET', 'POST', 'PUT', 'DELETE', 'HEAD', 'OPTIONS')
+
+    def __init__(self, balancer, max_in_flight=MAX_IN_FLIGHT,
+                 keepalive_timeout=ASYNC_KEEPALIVE_TIMEOUT, cache=None, timeout=UPSTREAM_TIMEOUT):
+        self.balancer = balancer
+        self.cache = cache
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.keepalive_timeout = keepalive_timeout
+        self.open_connections = 0
+        self._slots = None
+
+    async def serve(self, host, port, backlog=ACCEPT_BACKLOG):
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        server = await asyncio.start_server(self.handle_client, host, port,
+                                            backlog=backlog, limit=STREAM_BUFFER)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        self.open_connections += 1
+        peer = writer.get_extra_info('peername')
+        client = peer[0] if peer else '-'
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'),
+                                                  self.keepalive_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                        asyncio.LimitOverrunError, ConnectionError):
+                    break
+                keep_alive = await self.handle_request(client, head, reader, writer)
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+    async def handle_request(self, client, head, reader, writer):
+        """Serve one request; return True when the connection may be reused"""
+        lines = head.decode('latin-1').split('\r\n')
+        requestline = lines[0]
+        try:
+            method, target, version = requestline.split(' ', 2)
+            headers = self._parse_headers(lines[1:])
+        except ValueError:
+            await self._send_plain(writer, 400, b"400 Bad Request\n")
+            self._log(client, requestline, 400)
+            return False
+
+        connection = self._header(headers, 'Connection').lower()
+        keep_alive = (version == 'HTTP/1.1' and 'close' not in connection) or \
+                     (version == 'HTTP/1.0' and 'keep-alive' in connection)
+
+        if method not in self.methods:
+            await self._send_plain(writer, 501, b"501 Not Implemented\n")
+            self._log(client, requestline, 501)
+            return False
+        if method == 'GET' and target.startswith(STATUS_PREFIX):
+            status = await self._send_status(writer, target, keep_alive)
+            self._log(client, requestline, status)
+            return keep_alive
+        state = {'started': False, 'status': 0, 'bytes_out': 0,
+                 'request_sink': None, 'response_sink': None}
+        METRICS.start()
+        received_at = time.time()
+        started = time.monotonic()
+        try:
+            return await self._serve(client, requestline, method, target, version, headers,
+                                     reader, writer, keep_alive, state)
+        finally:
+            total = time.monotonic() - started
+            bytes_in = state['request_sink'].bytes if state['request_sink'] else 0
+            bytes_out = state['bytes_out']
+            if state['response_sink'] is not None:
+                bytes_out += state['response_sink'].bytes
+            METRICS.finish(method, state['status'], total, bytes_in, bytes_out)
+            if ACCESS_LOG is not None:
+                ACCESS_LOG.log({
+                    'ts': received_at,
+                    'client': client,
+                    'method': method,
+                    'path': target,
+                    'status': state['status'],
+                    'bytes_in': bytes_in,
+                    'bytes_out': bytes_out,
+                    'backend': state.get('backend'),
+                    'cache': state.get('cache'),
+                    'connect_ms': ms(state.get('connect')),
+                    'ttfb_ms': ms(state.get('ttfb')),
+                    'total_ms': ms(total),
+                    'user_agent': self._header(headers, 'User-Agent') or None,
+                })
+
+    async def _serve(self, client, requestline, method, target, version, headers,
+                     reader, writer, keep_alive, state):
+        """Answer from the cache or proxy; return True when the connection may be reused"""
+        if self.cache is not None and method in ('GET', 'HEAD'):
+            entry = self.cache.lookup(target, self._lookup(headers))
+            state['cache'] = 'miss' if entry is None else 'hit'
+            if entry is None and method == 'GET' and COALESCER is not None:
+                entry = await self._join_flight(target, headers, state)
+            if entry is not None:
+                status = await self._send_cached(writer, method, entry, headers, keep_alive)
+                state['status'] = status
+                if status == 200 and method == 'GET':
+                    state['bytes_out'] = len(entry.body)
+                self._log(client, requestline, status)
+                return keep_alive
+
+        try:
+            return await self._forward(client, requestline, method, target, version, headers,
+                                       reader, writer, keep_alive, state)
+        finally:
+            if state.get('flight') is not None:
+                COALESCER.finish(state['flight'])
+
+    async def _join_flight(self, target, headers, state):
+        """Lead or wait on the single flight for this GET; return a shared entry or None"""
+        lookup = self._lookup(headers)
+        key = self.cache.flight_key(target, lookup)
+        if key is None:
+            return None
+        flight, leader = COALESCER.join(key)
+        if leader:
+            state['flight'] = flight
+            return None
+        try:
+            await asyncio.wait_for(flight.done.wait(), COALESCER.wait_timeout)
+        except asyncio.TimeoutError:
+            pass
+        entry = COALESCER.result(flight, self.cache.variant_key(target, lookup))
+        if entry is not None:
+            state['cache'] = 'coalesced'
+        return entry
+
+    async def _forward(self, client, requestline, method, target, version, headers,
+                       reader, writer, keep_alive, state):
+        """Proxy under the in-flight limit, mapping failures to 502/500"""
+        async with self._slots:
+            try:
+                status, upstream_keep_alive = await self._proxy(
+                    method, target, version, headers, reader, writer, keep_alive, state)
+                self._log(client, requestline, status)
+                return keep_alive and upstream_keep_alive
+            except (UpstreamError, OSError, asyncio.TimeoutError,
+                    asyncio.IncompleteReadError) as e:
+                if state['started']:
+                    print(f"Stream aborted: {e}", file=sys.stderr)
+                    return False
+                print(f"Backend connection failed: {e}", file=sys.stderr)
+                state['status'] = 502
+                await self._send_plain(writer, 502, b"502 Bad Gateway - Backend unavailable\n")
+                self._log(client, requestline, 502)
+                return False
+            except Exception as e:
+                print(f"Proxy error: {e}", file=sys.stderr)
+                if not state['started']:
+                    state['status'] = 500
+                    await self._send_plain(writer, 500, b"500 Internal Server Error\n")
+                    self._log(client, requestline, 500)
+                return False
+
+    async def _proxy(self, method, target, version, headers, reader, writer, keep_alive, state):
+        """Forward one request and stream the response back to the client"""
+        chunked_request = 'chunked' in self._header(headers, 'Transfer-Encoding').lower()
+        content_length = self._header(headers, 'Content-Length')
+        has_body = chunked_request or bool(content_length)
+
+        if has_body and self._header(headers, 'Expect').lower() == '100-continue':
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+        upstream_head = []
+        for name, value in headers:
+            lower = name.lower()
+            if lower in ('host', 'expect', 'content-length') or lower in HOP_BY_HOP_HEADERS:
+                continue
+            upstream_head.append(f"{name}: {value}")
+        if chunked_request:
+            upstream_head.append("Transfer-Encoding: chunked")
+        elif content_length:
+            upstream_head.append(f"Content-Length: {int(content_length)}")
+        request_line = f"{method} {target} HTTP/1.1"
+
+        backend, conn, response_head = await self._open_upstream(request_line, upstream_head,
+                                                                 has_body, state)
+        try:
+            if has_body:
+                sink = BodySink(conn[1], rechunk=chunked_request)
+                state['request_sink'] = sink
+                if chunked_request:
+                    await self._copy_chunked_body(reader, sink)
+                else:
+                    await self._copy_body(reader, sink, int(content_length))
+                sink.finish()
+                await conn[1].drain()
+                started = time.monotonic()
+                response_head = await self._read_response_head(conn[0])
+                state['ttfb'] = time.monotonic() - started
+                self.balancer.observe(backend, state['ttfb'])
+                METRICS.observe_upstream(state['ttfb'])
+
+            status, response_headers, upstream_keep_alive = response_head
+            await self._relay_response(method, target, version, headers, status,
+                                       response_headers, conn[0], writer, keep_alive, state)
+        except BaseException:
+            conn[1].close()
+            raise
+        finally:
+            self.balancer.release(backend)
+        backend.async_pool.release(conn, reusable=upstream_keep_alive and state.get('reusable', True))
+        return status, state.get('client_keep_alive', True)
+
+    async def _open_upstream(self, request_line, header_lines, has_body, state):
+        """Send the request head to a backend; return (backend, conn, response head)
+
+        Connect and first-byte timings are recorded in state for the access
+        log. The response head is None when a body still has to be sent. The
+        caller must balancer.release() the backend once done. Requests
+        without a body move on to another backend when the first one cannot
+        be reached.
+        """
+        tried = []
+        while True:
+            backend = self.balancer.choose(exclude=tried)
+            tried.append(backend)
+            pool = backend.async_pool
+            head_bytes = ('\r\n'.join([request_line, f"Host: {backend.name}"] + header_lines)
+                          + '\r\n\r\n').encode('latin-1')
+            state['backend'] = backend.name
+            started = time.monotonic()
+            response_head = None
+            try:
+                conn, reused = await pool.acquire()
+                if not reused:
+                    state['connect'] = time.monotonic() - started
+                try:
+                    conn[1].write(head_bytes)
+                    await conn[1].drain()
+                    if not has_body:
+                        response_head = await self._read_response_head(conn[0])
+                except (ConnectionError, asyncio.IncompleteReadError, UpstreamError):
+                    conn[1].close()
+                    if not reused or has_body:
+                        raise
+                    # The backend dropped an idle connection; retry once on a fresh one
+                    conn = await pool.connect()
+                    conn[1].write(head_bytes)
+                    await conn[1].drain()
+                    response_head = await self._read_response_head(conn[0])
+            except (UpstreamError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                self.balancer.release(backend, failed=True)
+                if has_body or len(tried) >= min(len(self.balancer.backends), UPSTREAM_ATTEMPTS):
+                    raise
+                continue
+            except BaseException:
+                self.balancer.release(backend)
+                raise
+            if response_head is not None:
+                state['ttfb'] = time.monotonic() - started
+                self.balancer.observe(backend, state['ttfb'])
+                METRICS.observe_upstream(state['ttfb'])
+            return backend, conn, response_head
+
+    async def _read_response_head(self, upstream):
+        """Read status line and headers, skipping interim 1xx responses"""
+        while True:
+            try:
+                head = await asyncio.wait_for(upstream.readuntil(b'\r\n\r\n'), self.timeout)
+            except asyncio.IncompleteReadError as e:
+                raise UpstreamError("backend closed connection") from e
+            lines = head.decode('latin-1').split('\r\n')
+            try:
+                version, status = lines[0].split(' ', 2)[:2]
+                status = int(status)
+                headers = self._parse_headers(lines[1:])
+            except ValueError as e:
+                raise UpstreamError(f"malformed response: {lines[0]!r}") from e
+            if 100 <= status < 200 and status != 101:
+                continue
+            connection = self._header(headers, 'Connection').lower()
+            keep_alive = 'close' not in connection and version == 'HTTP/1.1'
+            return status, headers, keep_alive
+
+    async def _relay_response(self, method, target, version, request_headers, status, headers,
+                              upstream, writer, keep_alive, state):
+        """Stream the backend response to the client with a fixed-size buffer"""
+        has_body = method != 'HEAD' and status not in (204, 304) and status >= 200
+        upstream_chunked = 'chunked' in self._header(headers, 'Transfer-Encoding').lower()
+        length = self._header(headers, 'Content-Length')
+
+        lookup = self._lookup(request_headers)
+        compressible, coding = plan_compression(method, lookup, status, headers)
+        client_headers = compressed_headers(headers, coding) if compressible else headers
+
+        lines = [f"HTTP/1.1 {status} {self._reason(status)}"]
+        for name, value in client_headers:
+            if name.lower() not in HOP_BY_HOP_HEADERS:
+                lines.append(f"{name}: {value}")
+        client_chunked = False
+        if has_body and (coding is not None or upstream_chunked or not length):
+            if version == 'HTTP/1.1':
+                lines.append("Transfer-Encoding: chunked")
+                client_chunked = True
+            else:
+                keep_alive = False
+        if not keep_alive:
+            lines.append("Connection: close")
+        elif version == 'HTTP/1.0':
+            lines.append("Connection: keep-alive")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        state['started'] = True
+        state['status'] = status
+        state['client_keep_alive'] = keep_alive
+
+        if not has_body:
+            await writer.drain()
+            return
+
+        ttl = None
+        if self.cache is not None and method == 'GET':
+            ttl = self.cache.freshness(target, lookup, status, client_headers)
+        capture = BodyCapture(self.cache.max_entry_bytes) if ttl else None
+        sink = BodySink(writer, rechunk=client_chunked, capture=capture,
+                        encoder=StreamEncoder(coding) if coding else None)
+        state['response_sink'] = sink
+
+        if upstream_chunked:
+            await self._copy_chunked_body(upstream, sink)
+        elif length:
+            await self._copy_body(upstream, sink, int(length))
+        else:
+            # Unsized body: read until the backend closes
+            state['reusable'] = False
+            while True:
+                data = await asyncio.wait_for(upstream.read(STREAM_BUFFER), self.timeout)
+                if not data:
+                    break
+                sink.write(data)
+                await writer.drain()
+        sink.finish()
+        await writer.drain()
+
+        if capture is not None and capture.body() is not None:
+            entry = self.cache.store(target, lookup, status, client_headers, capture.body(), ttl)
+            if state.get('flight') is not None:
+                state['flight'].entry = entry
+                state['flight'].variant = self.cache.variant_key(target, lookup)
+
+    async def _send_cached(self, writer, method, entry, request_headers, keep_alive):
+        """Answer from the response cache, with 304 for matching validators"""
+        not_modified = entry.not_modified(self._lookup(request_headers))
+        status = 304 if not_modified else entry.status
+        lines = [f"HTTP/1.1 {status} {self._reason(status)}"]
+        lines.extend(f"{name}: {value}" for name, value in entry.response_headers(not_modified))
+        if not keep_alive:
+            lines.append("Connection: close")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if not not_modified and method != 'HEAD':
+            writer.write(entry.body)
+        await writer.drain()
+        return status
+
+    async def _copy_body(self, source, sink, length):
+        """Copy exactly length bytes from source into a BodySink"""
+        remaining = length
+        while remaining > 0:
+            data = await asyncio.wait_for(source.read(min(STREAM_BUFFER, remaining)),
+                                          self.timeout)
+            if not data:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(data)
+            sink.write(data)
+            await sink.stream.drain()
+
+    async def _copy_chunked_body(self, source, sink):
+        """Decode a chunked body from source into a BodySink"""
+        while True:
+            size_line = await asyncio.wait_for(source.readline(), self.timeout)
+            if not size_line:
+                raise asyncio.IncompleteReadError(b'', None)
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                break
+            await self._copy_body(source, sink, size)
+            await source.readexactly(2)  # CRLF after chunk data
+        while (await source.readline()) not in (b'\r\n', b'\n', b''):
+            pass  # trailer fields
+
+    async def _send_status(self, writer, target, keep_alive):
+        """Answer /_proxy/stats and /_proxy/metrics with the proxy's own counters"""
+        result = render_status(target, self.balancer, self.cache,
+                               open_connections=self.open_connections)
+        if result is None:
+            await self._send_plain(writer, 404, b"404 Not Found\n", keep_alive)
+            return 404
+        content_type, payload = result
+        writer.write((f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+                      f"Content-Length: {len(payload)}\r\n\r\n").encode() + payload)
+        await writer.drain()
+        return 200
+
+    async def _send_plain(self, writer, status, message, keep_alive=False):
+        """Send a short text/plain response, closing unless keep_alive"""
+        METRICS.proxy_error(status)
+        head = (f"HTTP/1.1 {status} {self._reason(status)}\r\n"
+                f"Content-Type: text/plain\r\nContent-Length: {len(message)}\r\n")
+        if not keep_alive:
+            head += "Connection: close\r\n"
+        try:
+            writer.write(head.encode() + b"\r\n" + message)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    @staticmethod
+    def _parse_headers(lines):
+        headers = []
+        for line in lines:
+            if not line:
+                continue
+            name, value = line.split(':', 1)
+            headers.append((name.strip(), value.strip()))
+        return headers
+
+    @staticmethod
+    def _lookup(headers):
+        """Lowercase-keyed view of a header list, as ResponseCache expects"""
+        return {name.lower(): value for name, value in headers}
+
+    @staticmethod
+    def _header(headers, name):
+        name = name.lower()
+        for key, value in headers:
+            if key.lower() == name:
+                return value
+        return ''
+
+    @staticmethod
+    def _reason(status):
+        try:
+            return HTTPStatus(status).phrase
+        except ValueError:
+            return ''
+
+    def _log(self, client, requestline, status):
+        """Same line format as ProxyHandler.log_message"""
+        if ACCESS_LOG is not None:
+            return
+        timestamp = time.strftime('%d/%b/%Y %H:%M:%S')
+        print(f'{client} - [{timestamp}] "{requestline}" {status} -')
+
+
 if __name__ == '__main__':
-    PORT = 80
+    import argparse
+
+    parser = argparse.ArgumentParser(description="InsightLearn reverse proxy")
+    parser.add_argument("--port", type=int, default=80, help="Port to listen on (default: 80)")
+    parser.add_argument("--engine", choices=["threaded", "serial", "asyncio"], default="threaded",
+                        help="threaded: thread per request; serial: one request at a time; "
+                             "asyncio: event loop for many idle keep-alive clients (default: threaded)")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+                        help=f"Maximum concurrent requests (default: {MAX_IN_FLIGHT})")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS,
+                        help=f"Open client connections for the threaded engine, "
+                             f"idle keep-alive included (default: {MAX_CONNECTIONS})")
+    parser.add_argument("--accept-backlog", type=int, default=ACCEPT_BACKLOG,
+                        help=f"Listen backlog while all slots are busy (default: {ACCEPT_BACKLOG})")
+    parser.add_argument("--backend", type=parse_backend, action="append", dest="backends",
+                        metavar="HOST:PORT",
+                        help=f"Upstream replica, repeatable (default: {BACKEND_HOST}:{BACKEND_PORT})")
+    parser.add_argument("--balance", choices=LoadBalancer.strategies, default="round-robin",
+                        help="Load-balancing strategy across backends (default: round-robin)")
+    parser.add_argument("--health-path", default=HEALTH_PATH,
+                        help=f"Path probed on each backend (default: {HEALTH_PATH})")
+    parser.add_argument("--health-interval", type=float, default=HEALTH_INTERVAL,
+                        help=f"Seconds between health probes, 0 to disable (default: {HEALTH_INTERVAL})")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE,
+                        help=f"Idle upstream keep-alive connections to keep (default: {POOL_SIZE})")
+    parser.add_argument("--cache-size", type=int, default=CACHE_MAX_BYTES // (1024 * 1024),
+                        help="Response cache budget in MiB for static assets (default: 0, disabled)")
+    parser.add_argument("--pool-idle-timeout", type=float, default=POOL_IDLE_TIMEOUT,
+                        help=f"Seconds before an idle upstream connection is dropped (default: {POOL_IDLE_TIMEOUT})")
+    parser.add_argument("--no-coalesce", action="store_true",
+                        help="Send concurrent identical cacheable GETs upstream separately "
+                             "instead of waiting on one fetch")
+    parser.add_argument("--access-log", choices=["text", "json"], default="text",
+                        help="text: one printed line per request; json: buffered JSON lines "
+                             "with upstream timings (default: text)")
+    parser.add_argument("--access-log-file", default="-",
+                        help="File the JSON access log is appended to, - for stdout (default: -)")
+    parser.add_argument("--access-log-sample", type=float, default=1.0,
+                        help="Fraction of non-error requests written to the JSON log (default: 1.0)")
+    parser.add_argument("--access-log-queue", type=int, default=ACCESS_LOG_QUEUE,
+                        help=f"JSON records buffered before dropping (default: {ACCESS_LOG_QUEUE})")
+    args = parser.parse_args()
+
+    backends = [Backend(host, port, pool_size=args.pool_size, pool_idle_timeout=args.pool_idle_timeout)
+                for host, port in (args.backends or [(BACKEND_HOST, BACKEND_PORT)])]
+    BALANCER = LoadBalancer(backends, strategy=args.balance)
+    if args.health_interval > 0:
+        HealthChecker(BALANCER, path=args.health_path, interval=args.health_interval).start()
+    if args.cache_size > 0:
+        RESPONSE_CACHE = ResponseCache(args.cache_size * 1024 * 1024)
+        if not args.no_coalesce:
+            COALESCER = Coalescer(asyncio.Event if args.engine == "asyncio" else threading.Event)
+    if args.access_log == "json":
+        stream = sys.stdout if args.access_log_file == "-" else \
+            open(args.access_log_file, 'a', buffering=1024 * 1024, encoding='utf-8')
+        ACCESS_LOG = AccessLog(stream, sample_rate=args.access_log_sample,
+                               queue_size=args.access_log_queue)
+
+    PORT = args.port
 
     print(f"╔═══════════════════════════════════════════════════════════╗")
     print(f"║  InsightLearn Reverse Proxy                              ║")
     print(f"╚═══════════════════════════════════════════════════════════╝")
     print(f"")
     print(f"Listening on:  0.0.0.0:{PORT}")
-    print(f"Backend:       {BACKEND_HOST}:{BACKEND_PORT}")
+    print(f"Backends:      {', '.join(b.name for b in backends)} ({args.balance})")
+    if args.engine == "serial":
+        print(f"Mode:          serial")
+    elif args.engine == "threaded":
+        print(f"Mode:          threaded (max {args.max_in_flight} in flight, "
+              f"{args.max_connections} connections, backlog {args.accept_backlog})")
+    else:
+        print(f"Mode:          {args.engine} (max {args.max_in_flight} in flight, backlog {args.accept_backlog})")
+    if RESPONSE_CACHE is not None:
+        print(f"Cache:         {args.cache_size} MiB"
+              f"{' (coalescing identical GETs)' if COALESCER is not None else ''}")
+    if ACCESS_LOG is not None:
+        print(f"Access log:    json -> {args.access_log_file} (sample {args.access_log_sample})")
     print(f"")
     print(f"Site accessible at:")
     print(f"  http://wasm.insightlearn.cloud")
@@ -111,12 +2045,25 @@ if __name__ == '__main__':
     print()
 
     try:
-        server = HTTPServer(('0.0.0.0', PORT), ProxyHandler)
-        server.serve_forever()
+        if args.engine == "asyncio":
+            proxy = AsyncProxyServer(BALANCER, max_in_flight=args.max_in_flight,
+                                     cache=RESPONSE_CACHE)
+            asyncio.run(proxy.serve('0.0.0.0', PORT, backlog=args.accept_backlog))
+        elif args.engine == "serial":
+            server = HTTPServer(('0.0.0.0', PORT), ProxyHandler)
+            server.serve_forever()
+        else:
+            server = ConcurrentHTTPServer(('0.0.0.0', PORT), ProxyHandler,
+                                          max_in_flight=args.max_in_flight,
+                                          max_connections=args.max_connections,
+                                          accept_backlog=args.accept_backlog)
+            server.serve_forever()
     except PermissionError:
-        print("\n❌ ERROR: Port 80 requires root privileges")
+        print(f"\n❌ ERROR: Port {PORT} requires root privileges")
         print("Run with: sudo python3 reverse-proxy.py")
         sys.exit(1)
     except KeyboardInterrupt:
+        if ACCESS_LOG is not None:
+            ACCESS_LOG.close()
         print("\n\n✓ Proxy stopped")
         sys.exit(0)
@@ -1,47 +1,344 @@
 #!/usr/bin/env python3
-from http.server import HTTPServer, BaseHTTPRequestHandler
-import urllib.request
-import urllib.error
+"""
+Benchmark harness for reverse-proxy.py
 
-BACKEND_HOST = "192.168.58.2"
-BACKEND_PORT = 31081
+Starts a local stand-in backend, runs reverse-proxy.py against it as a
+subprocess and drives it with a configurable number of keep-alive clients
+and request mix. Reports throughput, p50/p95/p99 latency per request kind
+and the proxy's resident memory, so regressions are measurable without
+the real cluster.
+
+Usage:
+    python3 test-proxy.py                          # quick smoke test
+    python3 test-proxy.py --duration 30 --concurrency 64 --mix json=60,wasm=20,post=15,slow=5
+    python3 test-proxy.py --engine asyncio --proxy-arg=--cache-size=64 --json
+    python3 test-proxy.py --proxy-arg=--max-in-flight=4 --idle-clients 8 --concurrency 4
+"""
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+PROXY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reverse-proxy.py")
+PROXY_PORT = 8888
+
+# Stand-in backend responses
+JSON_BODY = json.dumps({"status": "Healthy", "service": "insightlearn-wasm"}).encode()
+WASM_SIZE = 2 * 1024 * 1024         # Bytes served for each .wasm request
+POST_SIZE = 16 * 1024               # Bytes sent with each POST
+SLOW_DELAY = 0.2                    # Seconds the slow endpoint waits before answering
+
+# Request kinds: method and path sent to the proxy
+REQUESTS = {
+    'json': ('GET', '/health'),
+    'wasm': ('GET', '/_framework/dotnet.native.wasm'),
+    'post': ('POST', '/api/echo'),
+    'slow': ('GET', '/api/slow'),
+}
+DEFAULT_MIX = "json=70,wasm=10,post=15,slow=5"
+
+
+class StandInBackend(BaseHTTPRequestHandler):
+    """Answers like the WASM frontend: small JSON, large blobs, echo, slow"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wasm = b'\0asm' + os.urandom(WASM_SIZE - 4)
 
-class ProxyHandler(BaseHTTPRequestHandler):
     def do_GET(self):
-        try:
-            backend_url = f"http://{BACKEND_HOST}:{BACKEND_PORT}{self.path}"
-            req = urllib.request.Request(backend_url)
-            with urllib.request.urlopen(req, timeout=5) as response:
-                self.send_response(response.status)
-                for header, value in response.headers.items():
-                    if header.lower() not in ['connection', 'transfer-encoding']:
-                        self.send_header(header, value)
-                self.end_headers()
-                self.wfile.write(response.read())
-        except Exception as e:
-            self.send_response(502)
-            self.end_headers()
-            self.wfile.write(f"Error: {e}".encode())
-    
+        if self.path.startswith('/_framework/'):
+            self.send_body(self.wasm, 'application/wasm',
+                           [('ETag', '"bench"'), ('Cache-Control', 'public, max-age=60')])
+        elif self.path == '/api/slow':
+            time.sleep(SLOW_DELAY)
+            self.send_body(JSON_BODY, 'application/json')
+        else:
+            self.send_body(JSON_BODY, 'application/json')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        self.send_body(json.dumps({"received": len(body)}).encode(), 'application/json')
+
+    def send_body(self, body, content_type, extra=()):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in extra:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
     def log_message(self, format, *args):
         pass  # Silenzioso
 
-print("Testing proxy on port 8888...")
-server = HTTPServer(('127.0.0.1', 8888), ProxyHandler)
-import threading
-t = threading.Thread(target=server.serve_forever, daemon=True)
-t.start()
 
-import time
-time.sleep(1)
-
-# Test
-import urllib.request
-try:
-    response = urllib.request.urlopen('http://127.0.0.1:8888/health', timeout=5)
-    print(f"✓ Proxy works! Status: {response.status}")
-    print(f"✓ Response: {response.read().decode()[:50]}")
-except Exception as e:
-    print(f"✗ Proxy failed: {e}")
-
-server.shutdown()
+def parse_mix(value):
+    """'json=70,wasm=10' -> [('json', 70), ('wasm', 10)]"""
+    mix = []
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in REQUESTS:
+            raise argparse.ArgumentTypeError(f"unknown request kind {kind!r} "
+                                             f"(choose from {', '.join(REQUESTS)})")
+        try:
+            mix.append((kind, float(weight or 1)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight in {part!r}")
+    return mix
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def proxy_memory(pid):
+    """(current RSS, peak RSS) of the proxy process in bytes, from /proc"""
+    rss = peak = 0
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith('VmHWM:'):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return rss, peak
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class LoadGenerator:
+    """Closed-loop clients, each on its own keep-alive connection"""
+
+    def __init__(self, port, concurrency, mix, duration, total_requests=None):
+        self.port = port
+        self.concurrency = concurrency
+        self.kinds = [kind for kind, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.duration = duration
+        self.total_requests = total_requests
+        self.post_body = os.urandom(POST_SIZE)
+        self._lock = threading.Lock()
+        self._issued = 0
+        self.latencies = {kind: [] for kind in self.kinds}
+        self.errors = {}
+        self.bytes_received = 0
+
+    def run(self):
+        self._deadline = time.monotonic() + self.duration
+        workers = [threading.Thread(target=self._worker, args=(random.Random(i),), daemon=True)
+                   for i in range(self.concurrency)]
+        started = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.monotonic() - started
+
+    def _next(self):
+        with self._lock:
+            if self.total_requests is not None:
+                if self._issued >= self.total_requests:
+                    return False
+            elif time.monotonic() >= self._deadline:
+                return False
+            self._issued += 1
+            return True
+
+    def _worker(self, rng):
+        conn = None
+        received = 0
+        latencies = {kind: [] for kind in self.kinds}
+        errors = {}
+        while self._next():
+            kind = rng.choices(self.kinds, self.weights)[0]
+            method, path = REQUESTS[kind]
+            body = self.post_body if method == 'POST' else None
+            started = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+                conn.request(method, path, body=body, headers={'Accept-Encoding': 'gzip, br'})
+                response = conn.getresponse()
+                data = response.read()
+                if response.status != 200:
+                    errors[f'{kind} {response.status}'] = errors.get(f'{kind} {response.status}', 0) + 1
+                    continue
+                if response.will_close:
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException) as e:
+                errors[f'{kind} {type(e).__name__}'] = errors.get(f'{kind} {type(e).__name__}', 0) + 1
+                if conn is not None:
+                    conn.close()
+                conn = None
+                continue
+            latencies[kind].append(time.perf_counter() - started)
+            received += len(data)
+        if conn is not None:
+            conn.close()
+        with self._lock:
+            self.bytes_received += received
+            for kind, values in latencies.items():
+                self.latencies[kind].extend(values)
+            for key, count in errors.items():
+                self.errors[key] = self.errors.get(key, 0) + count
+
+
+def open_idle_clients(port, count):
+    """Keep-alive connections that send one request and then sit idle
+
+    Browsers hold connections open between page loads; with more of these
+    than the proxy's in-flight cap, the measured clients show whether idle
+    connections take request slots away from active ones.
+    """
+    connections = []
+    for _ in range(count):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.request(*REQUESTS['json'])
+        conn.getresponse().read()
+        connections.append(conn)
+    return connections
+
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 2),
+        'p95_ms': round(percentile(values, 95) * 1000, 2),
+        'p99_ms': round(percentile(values, 99) * 1000, 2),
+        'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+def run_benchmark(args):
+    backend = ThreadingHTTPServer(('127.0.0.1', 0), StandInBackend)
+    backend.daemon_threads = True
+    threading.Thread(target=backend.serve_forever, daemon=True).start()
+
+    command = [sys.executable, PROXY_SCRIPT, '--port', str(args.port),
+               '--backend', f'127.0.0.1:{backend.server_address[1]}',
+               '--engine', args.engine] + args.proxy_args
+    proxy = subprocess.Popen(command, stdout=subprocess.DEVNULL,
+                             stderr=None if args.verbose else subprocess.DEVNULL)
+    idle = []
+    try:
+        if not wait_for_port(args.port):
+            print(f"✗ Proxy did not start: {' '.join(command)}", file=sys.stderr)
+            return None
+        rss_idle, _ = proxy_memory(proxy.pid)
+
+        if args.warmup:
+            LoadGenerator(args.port, min(args.concurrency, 4), args.mix, args.warmup).run()
+        idle = open_idle_clients(args.port, args.idle_clients)
+
+        load = LoadGenerator(args.port, args.concurrency, args.mix, args.duration,
+                             total_requests=args.requests)
+        elapsed = load.run()
+        rss_end, rss_peak = proxy_memory(proxy.pid)
+    finally:
+        for conn in idle:
+            conn.close()
+        proxy.terminate()
+        try:
+            proxy.wait(5)
+        except subprocess.TimeoutExpired:
+            proxy.kill()
+        backend.shutdown()
+
+    every = [value for values in load.latencies.values() for value in values]
+    completed = len(every)
+    return {
+        'engine': args.engine,
+        'proxy_args': args.proxy_args,
+        'concurrency': args.concurrency,
+        'idle_clients': args.idle_clients,
+        'mix': dict(args.mix),
+        'elapsed_s': round(elapsed, 3),
+        'completed': completed,
+        'errors': load.errors,
+        'throughput_rps': round(completed / elapsed, 1) if elapsed else 0.0,
+        'throughput_mib_s': round(load.bytes_received / elapsed / (1024 * 1024), 2) if elapsed else 0.0,
+        'latency': summarize(every),
+        'latency_by_kind': {kind: summarize(values) for kind, values in load.latencies.items()},
+        'memory': {'rss_idle_bytes': rss_idle, 'rss_end_bytes': rss_end, 'rss_peak_bytes': rss_peak},
+    }
+
+
+def print_report(result):
+    mib = 1024 * 1024
+    print(f"Engine:       {result['engine']} {' '.join(result['proxy_args'])}".rstrip())
+    print(f"Concurrency:  {result['concurrency']}"
+          + (f" (+{result['idle_clients']} idle keep-alive clients)" if result['idle_clients'] else ""))
+    print(f"Mix:          {', '.join(f'{k}={v:g}' for k, v in result['mix'].items())}")
+    print(f"Completed:    {result['completed']} requests in {result['elapsed_s']}s")
+    print(f"Throughput:   {result['throughput_rps']} req/s, {result['throughput_mib_s']} MiB/s")
+    errors = sum(result['errors'].values())
+    print(f"Errors:       {errors}" + (f" {result['errors']}" if errors else ""))
+    print()
+    print(f"{'kind':<8}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = list(result['latency_by_kind'].items()) + [('all', result['latency'])]
+    for kind, stats in rows:
+        print(f"{kind:<8}{stats['requests']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    print()
+    memory = result['memory']
+    print(f"Proxy RSS:    idle {memory['rss_idle_bytes'] / mib:.1f} MiB, "
+          f"end {memory['rss_end_bytes'] / mib:.1f} MiB, peak {memory['rss_peak_bytes'] / mib:.1f} MiB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark reverse-proxy.py against a local stand-in backend")
+    parser.add_argument("--port", type=int, default=PROXY_PORT, help=f"Proxy port (default: {PROXY_PORT})")
+    parser.add_argument("--engine", choices=["threaded", "serial", "asyncio"], default="threaded",
+                        help="Proxy engine to benchmark (default: threaded)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients (default: 16)")
+    parser.add_argument("--idle-clients", type=int, default=0,
+                        help="Keep-alive connections left idle during the run (default: 0)")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds to run (default: 5)")
+    parser.add_argument("--requests", type=int, default=None,
+                        help="Stop after this many requests instead of after --duration")
+    parser.add_argument("--warmup", type=float, default=1, help="Seconds of warm-up traffic (default: 1)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Weighted request kinds out of {', '.join(REQUESTS)} (default: {DEFAULT_MIX})")
+    parser.add_argument("--proxy-arg", action="append", dest="proxy_args", default=[],
+                        help="Extra reverse-proxy.py argument, repeatable (e.g. --proxy-arg=--cache-size=64)")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show the proxy's stderr")
+    args = parser.parse_args()
+
+    if not args.json:
+        print(f"Benchmarking proxy on port {args.port}...")
+    result = run_benchmark(args)
+    if result is None:
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    sys.exit(1 if result['completed'] == 0 else 0)